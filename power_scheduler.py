@@ -3,12 +3,28 @@ Power Scheduler for Linux
 一個用於 Linux 系統的電源排程工具，支援定時關機、重啟、休眠等功能
 """
 
+import argparse
+import bisect
+import calendar
+import ctypes
+import functools
+import hmac
+import json
 import os
 import shlex
+import socket
+import socketserver
+import statistics
 import subprocess
+import sys
+import threading
+import time
 import tkinter as tk
-from datetime import datetime, timedelta
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, time as dt_time, timedelta, timezone
 from tkinter import ttk, messagebox, filedialog
+from zoneinfo import ZoneInfo, available_timezones
 
 
 # --- 核心邏輯類別 ---
@@ -33,7 +49,7 @@ class AutostartManager:
         desktop_content = f"""[Desktop Entry]
 Type=Application
 Name=Power Scheduler
-Exec=/usr/bin/python3 {self.script_path}
+Exec=/usr/bin/python3 {self.script_path} --minimized
 Comment=Power scheduling application
 Icon=system-shutdown
 """
@@ -54,11 +70,304 @@ Icon=system-shutdown
                 messagebox.showerror("錯誤", f"無法刪除自動啟動檔案：\n{e}")
 
 
+class SettingsStore:
+    """保存最後一次啟動的排程，讓常駐模式在登入時自動恢復"""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(
+            os.path.expanduser("~"), ".config", "power-scheduler", "last_job.json")
+
+    # 恢復排程必須具備的欄位與型別
+    REQUIRED_FIELDS = {'task': str, 'mode': str, 'desktop_env': str, 'remind': bool, 'time': dict}
+    OPTIONAL_TEXT_FIELDS = ('tz', 'sound_file', 'message_text', 'exe_path',
+                            'custom_command', 'graph_file')
+    TIME_FIELDS = {
+        "指定時間": ('year', 'month', 'day', 'h', 'm', 's'),
+        "每天": ('h', 'm', 's'),
+        "每隔": ('h', 'm', 's'),
+        "倒數": ('h', 'm', 's'),
+    }
+
+    def load(self):
+        """讀取保存的排程設定，沒有、無法讀取或內容不正確時回傳 None"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return settings if self.is_valid(settings) else None
+
+    @classmethod
+    def is_valid(cls, settings):
+        """檢查保存的設定是否完整 (檔案可能被手動修改或來自舊版本)"""
+        if not isinstance(settings, dict):
+            return False
+        for key, kind in cls.REQUIRED_FIELDS.items():
+            if not isinstance(settings.get(key), kind):
+                return False
+        if any(not isinstance(settings.get(key, ""), str) for key in cls.OPTIONAL_TEXT_FIELDS):
+            return False
+        slack = settings.get('slack', 0)
+        if isinstance(slack, bool) or not isinstance(slack, (int, float)) or slack < 0:
+            return False
+
+        fields = cls.TIME_FIELDS.get(settings['mode'])
+        time_config = settings['time']
+        if fields is None or not all(
+                isinstance(time_config.get(key), int) and not isinstance(time_config[key], bool)
+                for key in fields):
+            return False
+        h, m, sec = time_config['h'], time_config['m'], time_config['s']
+        if min(h, m, sec) < 0 or (h, m, sec) == (0, 0, 0) and settings['mode'] in ("每隔", "倒數"):
+            return False
+        if settings['mode'] in ("指定時間", "每天") and not (h < 24 and m < 60 and sec < 60):
+            return False
+
+        if settings['task'] == "任務流程":
+            try:
+                TaskGraph(settings.get('graph'), settings.get('graph_workers', 4))
+            except ValueError:
+                return False
+        return True
+
+    def save(self, settings):
+        """保存排程設定"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(settings, f, ensure_ascii=False, indent=2)
+        except OSError:
+            pass  # 保存失敗不影響目前的排程
+
+    def clear(self):
+        """刪除保存的排程設定"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SoundCache:
+    """把音效檔解碼成 PCM 並快取，總大小超過上限時淘汰最久未使用的項目
+
+    decode(path, limit) 解碼出的 PCM 超過 limit 位元組時必須拋出 ValueError；
+    可在背景執行緒呼叫 load()。
+    """
+
+    SAMPLE_RATE = 44100
+    CHANNELS = 2
+    READ_SIZE = 65536
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, decode=None):
+        self.max_bytes = max_bytes
+        self.decode = decode or self._decode_ffmpeg
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def load(self, path):
+        """解碼並快取音效檔 (已快取時直接回傳)"""
+        pcm = self.get(path)
+        if pcm is not None:
+            return pcm
+
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"找不到音效檔: {path}")
+        pcm = self.decode(path, self.max_bytes)
+        if len(pcm) > self.max_bytes:
+            raise ValueError("音效檔太長，無法預先載入。")
+
+        with self.lock:
+            key = os.path.abspath(path)
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = pcm
+            self.size += len(pcm)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return pcm
+
+    def get(self, path):
+        """取得已快取的 PCM，沒有快取時回傳 None"""
+        key = os.path.abspath(path)
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    @classmethod
+    def _decode_ffmpeg(cls, path, limit):
+        """使用 ffmpeg 解碼成 16 位元 PCM，邊讀邊檢查大小，超過 limit 時立即中止"""
+        try:
+            process = subprocess.Popen(
+                ["ffmpeg", "-v", "error", "-i", path, "-f", "s16le",
+                 "-ac", str(cls.CHANNELS), "-ar", str(cls.SAMPLE_RATE), "-"],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+        except FileNotFoundError:
+            raise OSError("找不到 'ffmpeg' 指令，無法預先解碼音效。")
+
+        chunks = []
+        size = 0
+        with process:
+            while True:
+                chunk = process.stdout.read(cls.READ_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    process.kill()
+                    raise ValueError("音效檔太長，無法預先載入。")
+                chunks.append(chunk)
+            stderr = process.stderr.read()
+        if process.returncode != 0:
+            raise ValueError(f"無法解碼音效檔:\n{stderr.decode(errors='replace').strip()}")
+        return b"".join(chunks)
+
+
+class PipeSink:
+    """從標準輸入讀取 PCM 的播放器行程，觸發前預熱即可立即出聲
+
+    播放完畢或停止後行程即結束，不會長時間占用音效裝置 (讓音效卡能閒置省電)。
+    """
+
+    COMMANDS = [
+        ["pacat", "--raw", "--format=s16le", f"--rate={SoundCache.SAMPLE_RATE}",
+         f"--channels={SoundCache.CHANNELS}", "--latency-msec=50"],
+        ["aplay", "-q", "-t", "raw", "-f", "S16_LE", "-r", str(SoundCache.SAMPLE_RATE),
+         "-c", str(SoundCache.CHANNELS)],
+    ]
+    CHUNK_SIZE = 8192
+
+    def __init__(self):
+        self.process = None
+        self.writer = None
+        self.stop_event = threading.Event()
+
+    def warm(self):
+        """預先啟動播放器行程"""
+        if self.process and self.process.poll() is None:
+            return
+        for command in self.COMMANDS:
+            try:
+                self.process = subprocess.Popen(
+                    command,
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+                return
+            except FileNotFoundError:
+                continue
+        raise OSError("找不到 'pacat' 或 'aplay' 指令，無法預先啟動播放器。")
+
+    def play(self, pcm):
+        """在背景執行緒把 PCM 寫入播放器"""
+        self.warm()
+        self.stop_event.clear()
+        process = self.process
+
+        def write():
+            try:
+                for offset in range(0, len(pcm), self.CHUNK_SIZE):
+                    if self.stop_event.is_set():
+                        return
+                    process.stdin.write(pcm[offset:offset + self.CHUNK_SIZE])
+                    process.stdin.flush()
+                # 關閉輸入讓播放器播完緩衝的音訊後自行結束
+                process.stdin.close()
+            except (OSError, ValueError):
+                pass  # 播放器已被停止
+
+        self.writer = threading.Thread(target=write, daemon=True)
+        self.writer.start()
+
+    def is_playing(self):
+        """是否仍在寫入音訊"""
+        return self.writer is not None and self.writer.is_alive()
+
+    def stop(self):
+        """停止播放 (下次播放或預熱時才會再啟動播放器)"""
+        self.close()
+
+    def close(self):
+        """結束播放器行程 (同時丟棄已緩衝的音訊)"""
+        self.stop_event.set()
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process = None
+
+
+class NullSink:
+    """不輸出聲音的播放器，只記錄收到的 PCM 以便測試"""
+
+    def __init__(self):
+        self.warmed = False
+        self.played = []
+
+    def warm(self):
+        self.warmed = True
+
+    def play(self, pcm):
+        self.played.append(pcm)
+
+    def is_playing(self):
+        return False
+
+    def stop(self):
+        pass
+
+    def close(self):
+        self.warmed = False
+
+
+class AlarmPlayer:
+    """以預先解碼的 PCM 與預熱的播放器播放鬧鐘，讓聲音在觸發時立即開始"""
+
+    def __init__(self, cache=None, sink=None):
+        self.cache = cache or SoundCache()
+        self.sink = sink or PipeSink()
+
+    def prepare(self, sound_file):
+        """建立任務時預先解碼音效 (可在背景執行緒呼叫)"""
+        self.cache.load(sound_file)
+
+    def warm(self):
+        """觸發前不久才啟動播放器，播放器無法使用時拋出 OSError"""
+        self.sink.warm()
+
+    def play(self, sound_file):
+        """播放已快取的音效，沒有快取或播放器無法使用時回傳 False"""
+        pcm = self.cache.get(sound_file)
+        if pcm is None:
+            return False
+        try:
+            self.sink.play(pcm)
+        except OSError:
+            return False
+        return True
+
+    def is_playing(self):
+        return self.sink.is_playing()
+
+    def stop(self):
+        self.sink.stop()
+
+    def close(self):
+        self.sink.close()
+
+
 class ActionExecutor:
     """處理系統指令執行和音效播放"""
 
-    def __init__(self):
+    def __init__(self, alarm_player=None):
         self.sound_process = None
+        self.alarm_player = alarm_player or AlarmPlayer()
 
     # 通用系統指令
     GENERAL_COMMANDS = {
@@ -81,6 +390,9 @@ class ActionExecutor:
         }
     }
 
+    # 需要管理員權限的系統級操作
+    PRIVILEGED_ACTIONS = ["關機", "重新開機", "休眠"]
+
     def execute(self, action, desktop_env="GNOME", custom_command=None):
         """執行指定的動作"""
         command = self._get_command(action, desktop_env, custom_command)
@@ -89,8 +401,29 @@ class ActionExecutor:
 
         self._run_command(command, action)
 
+    def run(self, action, desktop_env="GNOME", custom_command=None):
+        """同步執行指定的動作並回傳結束碼 (錯誤以例外回報，供任務流程使用)"""
+        command = self._with_privileges(
+            self._resolve_command(action, desktop_env, custom_command), action)
+        return subprocess.run(command).returncode
+
+    def _with_privileges(self, command, action):
+        """系統級操作以 pkexec 取得管理員權限；已經是 root 時直接執行"""
+        if action in self.PRIVILEGED_ACTIONS and os.geteuid() != 0:
+            return ["pkexec"] + command
+        return command
+
     def _get_command(self, action, desktop_env, custom_command):
         """取得要執行的指令"""
+        try:
+            return self._resolve_command(action, desktop_env, custom_command)
+        except ValueError as e:
+            title, message = e.args
+            messagebox.showerror(title, message)
+            return None
+
+    def _resolve_command(self, action, desktop_env, custom_command):
+        """解析動作對應的指令，無法解析時拋出 ValueError(標題, 訊息)"""
         if action in self.DESKTOP_COMMANDS.get(desktop_env, {}):
             return self.DESKTOP_COMMANDS[desktop_env][action]
         elif action in self.GENERAL_COMMANDS:
@@ -101,20 +434,15 @@ class ActionExecutor:
             try:
                 return shlex.split(custom_command)
             except ValueError:
-                messagebox.showerror("指令錯誤", "無法解析指令，請檢查引號是否匹配。")
-                return None
+                raise ValueError("指令錯誤", "無法解析指令，請檢查引號是否匹配。")
         else:
-            messagebox.showerror("錯誤", f"未知的任務: {action}")
-            return None
+            raise ValueError("錯誤", f"未知的任務: {action}")
 
     def _run_command(self, command, action):
         """執行指令"""
         try:
             # 系統級操作需要管理員權限
-            if action in ["關機", "重新開機", "休眠"]:
-                subprocess.Popen(["pkexec"] + command)
-            else:
-                subprocess.Popen(command)
+            subprocess.Popen(self._with_privileges(command, action))
         except FileNotFoundError:
             messagebox.showerror("錯誤",
                 f"指令 '{command[0]}' 不存在。\n"
@@ -123,10 +451,36 @@ class ActionExecutor:
         except Exception as e:
             messagebox.showerror("執行失敗", f"執行 '{action}' 時發生錯誤:\n{e}")
 
+    def prepare_sound(self, sound_file):
+        """預先載入鬧鐘音效，失敗時回傳錯誤訊息 (播放時會改用 ffplay)"""
+        try:
+            self.alarm_player.prepare(sound_file)
+        except (OSError, ValueError) as e:
+            return str(e)
+        return None
+
+    def warm_sound(self):
+        """預先啟動鬧鐘播放器；無法啟動時播放時再改用其他方式"""
+        try:
+            self.alarm_player.warm()
+        except OSError:
+            pass
+
+    def release_sound(self):
+        """沒有在播放時結束預熱的播放器 (例如排程在觸發前被停止)"""
+        if not self.alarm_player.is_playing():
+            self.alarm_player.close()
+
     def play_sound(self, sound_file):
         """播放音效檔案"""
         if self.sound_process and self.sound_process.poll() is None:
             return  # 已在播放中，避免重複播放
+        if self.alarm_player.is_playing():
+            return
+
+        # 優先使用預先解碼的音效，即使原始檔案已被移動也能播放
+        if sound_file and self.alarm_player.play(sound_file):
+            return
 
         if not sound_file or not os.path.exists(sound_file):
             messagebox.showwarning("鬧鐘錯誤", "未指定有效的音效檔。")
@@ -148,23 +502,622 @@ class ActionExecutor:
 
     def stop_sound(self):
         """停止音效播放"""
+        self.alarm_player.stop()
         if self.sound_process and self.sound_process.poll() is None:
             self.sound_process.terminate()
             self.sound_process = None
 
+    def close(self):
+        """結束常駐的播放器"""
+        self.stop_sound()
+        self.alarm_player.close()
+
+
+class WakeAlarm:
+    """透過 RTC 喚醒鬧鐘讓系統在休眠期間能於排程時間自動喚醒
+
+    sysfs_root 可指向假的目錄結構以便測試。
+    """
+
+    def __init__(self, sysfs_root="/sys/class/rtc/rtc0"):
+        self.sysfs_root = sysfs_root
+        self.alarm_path = os.path.join(sysfs_root, "wakealarm")
+
+    def is_supported(self):
+        """檢查 RTC 是否支援喚醒鬧鐘"""
+        return os.path.exists(self.alarm_path)
+
+    def program(self, when):
+        """設定喚醒時間，成功時回傳 True"""
+        if not self.is_supported():
+            return False
+        epoch = int(when.timestamp())
+        try:
+            # 核心要求先清除舊的鬧鐘才能寫入新值
+            self._write("0")
+            self._write(str(epoch))
+        except PermissionError:
+            return self._rtcwake(["-m", "no", "-t", str(epoch)])
+        except OSError:
+            return False
+        return True
+
+    def clear(self):
+        """清除喚醒鬧鐘"""
+        if not self.is_supported():
+            return
+        try:
+            self._write("0")
+        except PermissionError:
+            self._rtcwake(["-m", "disable"])
+        except OSError:
+            pass
+
+    def _write(self, value):
+        """寫入 wakealarm 檔案"""
+        with open(self.alarm_path, "w", encoding="utf-8") as f:
+            f.write(value)
+
+    def _rtcwake(self, args):
+        """沒有寫入權限時改用 pkexec rtcwake 設定"""
+        device = os.path.basename(self.sysfs_root)
+        try:
+            result = subprocess.run(["pkexec", "rtcwake", "-d", device] + args,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            return False
+        return result.returncode == 0
+
+
+class ZoneTransitions:
+    """時區的 UTC 偏移轉換表，預先計算並依時區快取，用於正確處理夏令時間
+
+    重複出現的本地時間 (夏令時間結束) 取第一次出現；
+    不存在的本地時間 (夏令時間開始) 順延被跳過的長度，例如 02:30 變成 03:30。
+    """
+
+    _cache = {}
+    _cache_lock = threading.Lock()
+
+    # 掃描間隔；時區的兩次轉換至少相隔數小時
+    SCAN_STEP = 6 * 3600
+
+    def __init__(self, name):
+        self.name = name
+        self.zone = ZoneInfo(name)
+        self.lock = threading.Lock()
+        # (start, end, base_offset, instants, offsets)：已計算範圍 [start, end)
+        # (UTC 秒數)、start 時的偏移、轉換時間點，offsets[i] 自 instants[i] 起生效。
+        # 擴充時建立新的 tuple 一次替換，查詢時不需加鎖也不會讀到不一致的內容
+        self.table = None
+
+    @classmethod
+    def for_zone(cls, name):
+        """取得 (並快取) 指定時區的轉換表，時區不存在時拋出 KeyError 或 ValueError"""
+        with cls._cache_lock:
+            table = cls._cache.get(name)
+            if table is None:
+                table = cls._cache[name] = cls(name)
+            return table
+
+    @classmethod
+    def for_settings(cls, settings):
+        """取得任務設定所使用的時區轉換表 (未指定時使用系統時區)"""
+        return cls.for_zone(settings.get('tz') or cls.local_zone_name())
+
+    @staticmethod
+    def local_zone_name():
+        """取得系統的 IANA 時區名稱，無法判斷時回傳 UTC
+
+        依序嘗試 $TZ、/etc/localtime 與 /etc/timezone，只採用 zoneinfo 認得的名稱
+        ($TZ 也可能是 "UTC0" 之類 zoneinfo 不接受的 POSIX 規則字串)。
+        """
+        def candidates():
+            yield os.environ.get('TZ', '').lstrip(':')
+            yield os.path.realpath("/etc/localtime")
+            try:
+                with open("/etc/timezone", encoding="utf-8") as f:
+                    yield f.read().strip()
+            except OSError:
+                pass
+
+        for name in candidates():
+            if "zoneinfo/" in name:
+                name = name.split("zoneinfo/", 1)[1]
+            if not name:
+                continue
+            try:
+                ZoneInfo(name)
+            except (KeyError, ValueError, OSError):
+                continue
+            return name
+        return "UTC"
+
+    def _zone_offset(self, epoch):
+        """直接向 zoneinfo 查詢偏移秒數 (僅在建立轉換表時使用)"""
+        return int(datetime.fromtimestamp(epoch, self.zone).utcoffset().total_seconds())
+
+    def _scan(self, start, end):
+        """找出 [start, end) 間的所有轉換點 (精確到秒)"""
+        instants, offsets = [], []
+        previous = self._zone_offset(start)
+        t = start
+        while t < end:
+            step_end = min(t + self.SCAN_STEP, end)
+            offset = self._zone_offset(step_end)
+            if offset != previous:
+                low, high = t, step_end
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._zone_offset(middle) == previous:
+                        low = middle
+                    else:
+                        high = middle
+                instants.append(high)
+                offsets.append(offset)
+                previous = offset
+            t = step_end
+        return instants, offsets
+
+    def _ensure(self, epoch):
+        """回傳涵蓋 epoch 所在年份的轉換表 (以整年為單位擴充)"""
+        table = self.table
+        if table is not None and table[0] <= epoch < table[1]:
+            return table
+        with self.lock:
+            table = self.table
+            year = datetime.fromtimestamp(epoch, timezone.utc).year
+            if table is None:
+                start = calendar.timegm((year - 1, 1, 1, 0, 0, 0))
+                table = (start, start, self._zone_offset(start), [], [])
+            start, end, base_offset, instants, offsets = table
+            if epoch >= end:
+                new_end = calendar.timegm((year + 2, 1, 1, 0, 0, 0))
+                new_instants, new_offsets = self._scan(end, new_end)
+                instants, offsets = instants + new_instants, offsets + new_offsets
+                end = new_end
+            if epoch < start:
+                new_start = calendar.timegm((year, 1, 1, 0, 0, 0))
+                new_instants, new_offsets = self._scan(new_start, start)
+                instants, offsets = new_instants + instants, new_offsets + offsets
+                start = new_start
+                base_offset = self._zone_offset(new_start)
+            self.table = (start, end, base_offset, instants, offsets)
+            return self.table
+
+    def offset_at(self, epoch):
+        """查詢 UTC 時間點的偏移秒數"""
+        _, _, base_offset, instants, offsets = self._ensure(epoch)
+        index = bisect.bisect_right(instants, epoch) - 1
+        return offsets[index] if index >= 0 else base_offset
+
+    def to_utc(self, local):
+        """把本地時間 (naive datetime) 轉成 UTC 時間"""
+        wall = calendar.timegm(local.timetuple())
+        # 一天內最多只有一次轉換，前後一天的偏移就是所有可能的偏移
+        before = self.offset_at(wall - 86400)
+        after = self.offset_at(wall + 86400)
+        candidates = sorted(wall - offset for offset in {before, after}
+                            if self.offset_at(wall - offset) == offset)
+        # 沒有候選表示該時間不存在，以轉換前的偏移換算即為順延後的時間
+        utc = candidates[0] if candidates else wall - before
+        return datetime.fromtimestamp(utc, timezone.utc)
+
+    def to_local(self, moment):
+        """把 UTC 時間轉成帶固定偏移的本地時間"""
+        offset = self.offset_at(int(moment.timestamp()))
+        return moment.astimezone(timezone(timedelta(seconds=offset)))
+
+    def next_daily(self, hour, minute, second, after):
+        """計算晚於 after (UTC) 的下一個每日本地時間"""
+        day = self.to_local(after).date()
+        wall_time = dt_time(hour, minute, second)
+        target = self.to_utc(datetime.combine(day, wall_time))
+        if target <= after:
+            target = self.to_utc(datetime.combine(day + timedelta(days=1), wall_time))
+        return target
+
+
+class TaskGraph:
+    """任務流程：以相依關係 (DAG) 組合多個動作，互不相依的步驟並行執行
+
+    每個步驟是一個 dict，例如:
+        {"id": "backup", "task": "執行指令", "custom_command": "rsync ...",
+         "after": [], "on_failure": "stop"}
+    on_failure 為 "stop" 時，失敗步驟的後續步驟全部略過；
+    為 "continue" 時，後續步驟照常執行。
+    呼叫 cancel() 後不再提交新的步驟，已在執行中的步驟會跑完。
+    """
+
+    FAILURE_POLICIES = ("stop", "continue")
+
+    def __init__(self, steps, max_workers=4):
+        if not isinstance(steps, list):
+            raise ValueError("任務流程的 steps 必須是清單。")
+        if isinstance(max_workers, bool) or not isinstance(max_workers, int) or max_workers <= 0:
+            raise ValueError("max_workers 必須是正整數。")
+        self.steps = {}
+        for step in steps:
+            if not isinstance(step, dict):
+                raise ValueError("每個步驟都必須是 JSON 物件。")
+            step_id = step.get('id')
+            if not isinstance(step_id, str) or not step_id or 'task' not in step:
+                raise ValueError("每個步驟都必須有 'id' (非空字串) 與 'task'。")
+            after = step.get('after', [])
+            if not isinstance(after, list) or not all(isinstance(dep, str) for dep in after):
+                raise ValueError(f"步驟 '{step_id}' 的 after 必須是步驟 id 字串的清單。")
+            if step_id in self.steps:
+                raise ValueError(f"步驟 '{step_id}' 重複定義。")
+            if step.get('on_failure', "stop") not in self.FAILURE_POLICIES:
+                raise ValueError(f"步驟 '{step_id}' 的 on_failure 必須是 stop 或 continue。")
+            self.steps[step_id] = step
+
+        for step_id, step in self.steps.items():
+            for dep in step.get('after', []):
+                if dep not in self.steps:
+                    raise ValueError(f"步驟 '{step_id}' 相依於不存在的步驟 '{dep}'。")
+
+        self.order = self._topological_order()
+        self.max_workers = max_workers
+        self.results = {}
+        self.cancel_event = threading.Event()
+
+    @classmethod
+    def from_file(cls, path):
+        """從 JSON 檔載入任務流程 (步驟清單，或含 steps/max_workers 的物件)"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, list):
+            return cls(data)
+        if not isinstance(data, dict):
+            raise ValueError("任務流程檔必須是步驟清單或含 steps 的 JSON 物件。")
+        return cls(data.get('steps', []), max_workers=data.get('max_workers', 4))
+
+    def cancel(self):
+        """取消任務流程：尚未開始的步驟一律標記為 cancelled"""
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def _topological_order(self):
+        """計算拓撲順序，發現循環相依時拋出 ValueError"""
+        order = []
+        state = {}  # 1: 走訪中, 2: 已完成
+
+        def visit(step_id):
+            if state.get(step_id) == 2:
+                return
+            if state.get(step_id) == 1:
+                raise ValueError(f"任務流程存在循環相依 (步驟 '{step_id}')。")
+            state[step_id] = 1
+            for dep in self.steps[step_id].get('after', []):
+                visit(dep)
+            state[step_id] = 2
+            order.append(step_id)
+
+        for step_id in self.steps:
+            visit(step_id)
+        return order
+
+    def _is_blocked(self, step_id):
+        """檢查步驟是否因前置步驟失敗或略過而必須略過"""
+        for dep in self.steps[step_id].get('after', []):
+            status = self.results[dep]['status']
+            if status in ("skipped", "cancelled"):
+                return True
+            if status == "failed" and self.steps[dep].get('on_failure', "stop") == "stop":
+                return True
+        return False
+
+    def run(self, runner):
+        """執行任務流程直到結束，runner(step) 回傳非 0 結束碼或拋出例外視為失敗"""
+        self.results = {}
+        pending = {step_id: len(step.get('after', [])) for step_id, step in self.steps.items()}
+        dependents = {step_id: [] for step_id in self.steps}
+        for step_id, step in self.steps.items():
+            for dep in step.get('after', []):
+                dependents[dep].append(step_id)
+
+        origin = time.monotonic()
+
+        def run_step(step_id):
+            start = time.monotonic() - origin
+            if self.cancelled:
+                return {'status': "cancelled", 'error': None, 'start': start, 'end': start}
+            try:
+                code = runner(self.steps[step_id])
+                status, error = ("ok", None) if code in (0, None) else ("failed", f"結束碼 {code}")
+            except Exception as e:
+                status, error = "failed", str(e)
+            return {'status': status, 'error': error,
+                    'start': start, 'end': time.monotonic() - origin}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {}
+
+            def resolve(step_id):
+                """前置步驟皆已結束時，提交、略過或取消該步驟"""
+                if self.cancelled or self._is_blocked(step_id):
+                    now = time.monotonic() - origin
+                    status = "cancelled" if self.cancelled else "skipped"
+                    self.results[step_id] = {'status': status, 'error': None,
+                                             'start': now, 'end': now}
+                    for child in dependents[step_id]:
+                        pending[child] -= 1
+                        if pending[child] == 0:
+                            resolve(child)
+                else:
+                    futures[pool.submit(run_step, step_id)] = step_id
+
+            for step_id in self.order:
+                if pending[step_id] == 0:
+                    resolve(step_id)
+
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    step_id = futures.pop(future)
+                    self.results[step_id] = future.result()
+                    for child in dependents[step_id]:
+                        pending[child] -= 1
+                        if pending[child] == 0:
+                            resolve(child)
+
+        return self.results
+
+    @property
+    def succeeded(self):
+        """所有步驟皆成功完成"""
+        return all(r['status'] == "ok" for r in self.results.values())
+
+    def critical_path(self):
+        """依實際執行時間回溯關鍵路徑 (決定總完成時間的相依鏈)"""
+        executed = [s for s in self.order if s in self.results
+                    and self.results[s]['status'] not in ("skipped", "cancelled")]
+        if not executed:
+            return []
+        path = [max(executed, key=lambda s: self.results[s]['end'])]
+        while True:
+            deps = [d for d in self.steps[path[-1]].get('after', [])
+                    if self.results[d]['status'] not in ("skipped", "cancelled")]
+            if not deps:
+                break
+            path.append(max(deps, key=lambda d: self.results[d]['end']))
+        return list(reversed(path))
+
+    def report(self):
+        """產生各步驟耗時與關鍵路徑的文字報告"""
+        total = max((r['end'] for r in self.results.values()), default=0.0)
+        lines = [f"任務流程結束：總耗時 {total:.2f} 秒"]
+        for step_id in self.order:
+            r = self.results.get(step_id)
+            if r is None:
+                continue
+            line = (f"  {step_id:<16} {r['status']:<9} "
+                    f"{r['start']:7.2f} → {r['end']:7.2f} ({r['end'] - r['start']:.2f} 秒)")
+            if r['error']:
+                line += f"  {r['error']}"
+            lines.append(line)
+
+        path = self.critical_path()
+        if path:
+            length = self.results[path[-1]]['end'] - self.results[path[0]]['start']
+            lines.append(f"關鍵路徑：{' → '.join(path)} ({length:.2f} 秒)")
+        return "\n".join(lines)
+
+
+class TimerQueue:
+    """管理多個截止時間，依各自的容許誤差把鄰近的截止時間合併成一次喚醒
+
+    每個計時器在 [deadline, deadline + slack] 內觸發皆可，
+    next_window() 會從最早的截止時間開始，挑選能同時涵蓋最多計時器的時間區間。
+    """
+
+    def __init__(self):
+        self.timers = {}  # key -> (deadline, slack 秒數)
+        self.wakeups = 0
+        self.fired = 0
+        self.uncoalesced = 0  # 不合併時需要的喚醒次數 (每次喚醒中相異的截止時間數)
+
+    def add(self, key, deadline, slack=0):
+        """加入或更新計時器"""
+        self.timers[key] = (deadline, slack)
+
+    def remove(self, key):
+        """移除計時器"""
+        self.timers.pop(key, None)
+
+    def next_window(self):
+        """計算下一次喚醒的區間 (start, end)，沒有計時器時回傳 None
+
+        start 是本次合併的計時器中最晚的截止時間，end 是其中最早的容許上限，
+        在區間內任何時間點喚醒都能一次觸發這些計時器。
+        """
+        if not self.timers:
+            return None
+        start = end = None
+        for deadline, slack in sorted(self.timers.values(), key=lambda t: t[0]):
+            if end is not None and deadline > end:
+                break
+            start = deadline
+            limit = deadline + timedelta(seconds=slack)
+            end = limit if end is None else min(end, limit)
+        return start, end
+
+    def pop_due(self, now):
+        """取出截止時間已到的計時器，並記為一次喚醒"""
+        due = [key for key, (deadline, _) in self.timers.items() if deadline <= now]
+        if due:
+            self.wakeups += 1
+            self.fired += len(due)
+            self.uncoalesced += len({self.timers[key][0] for key in due})
+        for key in due:
+            del self.timers[key]
+        return due
+
+    @property
+    def wakeups_saved(self):
+        """因合併而省下的喚醒次數 (截止時間相同的計時器本來就只需一次喚醒，不算在內)"""
+        return self.uncoalesced - self.wakeups
+
+
+def set_timer_slack(seconds):
+    """設定目前執行緒的 timer slack (Linux prctl)，不支援時回傳 False"""
+    PR_SET_TIMERSLACK = 29
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.prctl(PR_SET_TIMERSLACK, ctypes.c_ulong(int(seconds * 1e9)), 0, 0, 0) == 0
+    except (OSError, AttributeError):
+        return False
+
+
+class Profiler:
+    """選擇性啟用的效能分析，把熱門路徑每次呼叫的耗時記錄到環狀緩衝區
+
+    啟用時才替登記的方法安裝計時包裝函式，停用時完全移除，因此平常沒有額外成本。
+    輸出格式依副檔名決定：.json 為 Chrome trace (chrome://tracing、Perfetto)，
+    其他為 flamegraph.pl 與 speedscope 可讀取的 collapsed stack 格式。
+    """
+
+    def __init__(self, capacity=100000):
+        self.events = deque(maxlen=capacity)
+        self.enabled = False
+        self.targets = []
+        self.installed = []
+        self.local = threading.local()
+        self.origin = time.perf_counter_ns()
+
+    @staticmethod
+    def default_path():
+        """預設的輸出檔名"""
+        return f"power-scheduler-profile-{datetime.now():%Y%m%d-%H%M%S}.json"
+
+    def register(self, obj, names):
+        """登記要分析的方法 (物件的方法或模組的函式)"""
+        for name in names:
+            self.targets.append((obj, name))
+            if self.enabled:
+                self._install(obj, name)
+
+    def enable(self):
+        """開始記錄"""
+        if self.enabled:
+            return
+        self.enabled = True
+        for obj, name in self.targets:
+            self._install(obj, name)
+
+    def disable(self):
+        """停止記錄並移除所有包裝函式"""
+        self.enabled = False
+        while self.installed:
+            obj, name, original, had_own = self.installed.pop()
+            if had_own:
+                setattr(obj, name, original)
+            else:
+                delattr(obj, name)  # 恢復為類別上的方法
+
+    def toggle(self):
+        """切換記錄狀態，回傳切換後是否啟用"""
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def _install(self, obj, name):
+        """以計時包裝函式取代 obj.name"""
+        original = getattr(obj, name)
+        had_own = name in vars(obj)
+        owner = obj.__name__ if isinstance(obj, type(os)) else type(obj).__name__
+        setattr(obj, name, self._wrap(f"{owner}.{name}", original))
+        self.installed.append((obj, name, original, had_own))
+
+    def _wrap(self, label, func):
+        """建立記錄耗時與呼叫堆疊的包裝函式"""
+        events = self.events
+        local = self.local
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stack = getattr(local, 'stack', None)
+            if stack is None:
+                stack = local.stack = []
+            frame = [label, 0]  # 名稱, 子呼叫耗時
+            stack.append(frame)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                duration = time.perf_counter_ns() - start
+                path = tuple(f[0] for f in stack)
+                stack.pop()
+                if stack:
+                    stack[-1][1] += duration
+                events.append((path, threading.get_ident(), start, duration, duration - frame[1]))
+
+        return wrapper
+
+    def dump(self, path):
+        """輸出目前緩衝區內的記錄"""
+        events = list(self.events)
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                trace = [{
+                    'name': stack[-1],
+                    'cat': "power-scheduler",
+                    'ph': "X",
+                    'ts': (start - self.origin) / 1000,
+                    'dur': duration / 1000,
+                    'pid': os.getpid(),
+                    'tid': thread_id,
+                } for stack, thread_id, start, duration, _ in events]
+                json.dump({'traceEvents': trace, 'displayTimeUnit': "ms"}, f)
+            else:
+                totals = {}
+                for stack, _, _, _, self_time in events:
+                    totals[stack] = totals.get(stack, 0) + self_time
+                for stack, self_time in sorted(totals.items()):
+                    f.write(f"{';'.join(stack)} {max(1, self_time // 1000)}\n")
+
 
 class Scheduler:
     """處理任務排程邏輯"""
 
-    def __init__(self, app_instance):
+    # 牆上時間比單調時間多走超過此秒數，視為系統剛從休眠喚醒
+    RESUME_THRESHOLD = 5
+
+    # 執行後會繼續排下一次的模式
+    REPEATING_MODES = ["每天", "每隔"]
+
+    # 視窗縮小時單次 tick 最長的延遲 (毫秒)。after() 以單調時間計時，休眠期間
+    # 不會前進，因此必須定期醒來比對牆上時間才能偵測喚醒
+    MAX_IDLE_DELAY = 60000
+
+    # 鬧鐘在觸發前多少秒預先啟動播放器
+    SOUND_WARM_LEAD = 30
+
+    # 喚醒時執行時間已過超過此秒數 (再加上任務的容許誤差) 就不補執行
+    MISSED_FIRE_GRACE = 300
+
+    def __init__(self, app_instance, wake_alarm=None):
         self.app = app_instance
+        self.wake_alarm = wake_alarm or WakeAlarm()
+        self.wake_armed = False
+        self.last_tick = None
         self.job = None
         self.running = False
         self.paused = False
         self.target_time = None
         self.time_left = None
         self.reminder_sent = False
+        self.sound_warmed = False
         self.settings = None
+        self.graph = None
+        self.graph_thread = None
+        self.last_graph_report = None
 
     def start(self, settings):
         """開始排程任務"""
@@ -172,15 +1125,36 @@ class Scheduler:
         self.running = True
         self.paused = False
         self.reminder_sent = False
+        self.sound_warmed = False
+        self.last_tick = None
         self.app.update_ui_for_running_state(True)
 
         self._calculate_target_time()
+        self._prepare_sounds()
         self.tick()
 
+    def _prepare_sounds(self):
+        """建立任務時在背景執行緒預先解碼所有鬧鐘音效，讓觸發時能立即播放"""
+        steps = self.settings.get('graph') or [self.settings]
+        sound_files = [step['sound_file'] for step in steps
+                       if step['task'] == "鬧鐘" and step.get('sound_file')]
+        if not sound_files:
+            return
+
+        def run():
+            for sound_file in sound_files:
+                error = self.app.action_executor.prepare_sound(sound_file)
+                if error:
+                    self.app.root.after(0, lambda error=error: messagebox.showwarning(
+                        "鬧鐘音效", f"無法預先載入音效，時間到時將改用 ffplay 播放:\n{error}"))
+
+        threading.Thread(target=run, daemon=True).start()
+
     def _calculate_target_time(self):
-        """計算目標執行時間"""
+        """計算目標執行時間 (一律以 UTC 表示，指定時間與每天依任務時區換算)"""
         mode = self.settings['mode']
         time_config = self.settings['time']
+        now = datetime.now(timezone.utc)
 
         if mode == "倒數":
             self.time_left = timedelta(
@@ -188,25 +1162,20 @@ class Scheduler:
                 minutes=time_config['m'],
                 seconds=time_config['s']
             )
-            self.target_time = datetime.now() + self.time_left
+            self.target_time = now + self.time_left
 
         elif mode == "指定時間":
-            self.target_time = datetime(
+            self.target_time = ZoneTransitions.for_settings(self.settings).to_utc(datetime(
                 year=time_config['year'],
                 month=time_config['month'],
                 day=time_config['day'],
                 hour=time_config['h'],
                 minute=time_config['m'],
                 second=time_config['s']
-            )
+            ))
 
-        elif mode == "每隔":
-            interval = timedelta(
-                hours=time_config['h'],
-                minutes=time_config['m'],
-                seconds=time_config['s']
-            )
-            self.target_time = datetime.now() + interval
+        else:
+            self.target_time = self.next_fire_time(now)
 
     def stop(self):
         """停止排程任務"""
@@ -215,6 +1184,12 @@ class Scheduler:
             self.job = None
         self.running = False
         self.paused = False
+        if self.graph_running():
+            self.graph.cancel()
+        if self.sound_warmed:
+            self.app.action_executor.release_sound()
+            self.sound_warmed = False
+        self._disarm_wake_alarm()
         self.app.update_ui_for_running_state(False)
         self.app.update_status_display()
 
@@ -224,12 +1199,12 @@ class Scheduler:
             return
 
         self.paused = not self.paused
-        self.app.pause_button.config(text="繼續" if self.paused else "暫停")
+        self.app.update_pause_button(self.paused)
 
         if not self.paused:
             # 倒數模式繼續時需重新計算目標時間
             if self.settings['mode'] == "倒數":
-                self.target_time = datetime.now() + self.time_left
+                self.target_time = datetime.now(timezone.utc) + self.time_left
             self.tick()
 
     def tick(self):
@@ -237,55 +1212,135 @@ class Scheduler:
         if not self.running or self.paused:
             return
 
-        now = datetime.now()
+        now = datetime.now(timezone.utc)
+        self._detect_resume(now)
+        if not self.running:
+            return  # 喚醒後發現單次任務已錯過太久而取消
         self._update_time_left(now)
         self.app.update_status_display(self.time_left)
 
         self._check_reminder()
+        self._warm_sound()
 
         if self._should_execute():
             self.execute_action()
-            if self.settings['mode'] != "每隔":
-                self.stop()
+            if self.settings['mode'] not in self.REPEATING_MODES:
+                if self.settings['task'] == "任務流程":
+                    # 流程結束時由 _on_graph_finished 停止，期間維持執行中狀態
+                    self.job = None
+                else:
+                    self.stop()
                 return
 
-        self.job = self.app.root.after(1000, self.tick)
+        self.job = self.app.root.after(self._next_tick_delay(now), self.tick)
+
+    def _next_tick_delay(self, now):
+        """計算下一次 tick 的延遲 (毫秒)
+
+        視窗可見時每秒更新倒數；視窗縮小時睡到下一個事件 (在任務的容許
+        誤差內延後喚醒)，但最長不超過 MAX_IDLE_DELAY，以便偵測系統喚醒。
+        """
+        if self.app.is_status_visible():
+            return 1000
+        slack = timedelta(seconds=self.settings.get('slack', 0))
+        wake_time = now + self.time_left + slack
+        if self.settings['remind'] and not self.reminder_sent:
+            wake_time = min(wake_time, now + self.time_left - timedelta(seconds=60))
+        if self.settings['task'] == "鬧鐘" and not self.sound_warmed:
+            wake_time = min(wake_time, now + self.time_left -
+                            timedelta(seconds=self.SOUND_WARM_LEAD))
+        delay = int((wake_time - now).total_seconds() * 1000)
+        return min(self.MAX_IDLE_DELAY, max(1000, delay))
+
+    def refresh(self):
+        """立即重新 tick (例如視窗重新顯示時)"""
+        if not self.running or self.paused:
+            return
+        if self.job:
+            self.app.root.after_cancel(self.job)
+            self.job = None
+        self.tick()
 
     def _update_time_left(self, now):
         """更新剩餘時間"""
+        if self.settings['mode'] in self.REPEATING_MODES and now >= self.target_time:
+            self.execute_action()
+            # 計算下一個執行時間
+            self.target_time = self.next_fire_time(now, self.target_time)
+
+        self.time_left = self.target_time - now
+        if self.time_left.total_seconds() < 0:
+            self.time_left = timedelta(0)
+
+    def next_fire_time(self, after, previous=None):
+        """計算晚於 after (UTC) 的下一次執行時間，沒有下一次時回傳 None
+
+        previous 是目前排定的執行時間：「每隔」在它尚未到期時沿用，
+        單次模式則只會回傳它 (尚未到期時)。
+        """
         mode = self.settings['mode']
+        time_config = self.settings['time']
 
-        if mode in ["倒數", "指定時間"]:
-            self.time_left = self.target_time - now
-            if self.time_left.total_seconds() < 0:
-                self.time_left = timedelta(0)
+        if mode == "每天":
+            return ZoneTransitions.for_settings(self.settings).next_daily(
+                time_config['h'], time_config['m'], time_config['s'], after)
 
-        elif mode == "每天":
-            time_config = self.settings['time']
-            target_today = now.replace(
-                hour=time_config['h'],
-                minute=time_config['m'],
-                second=time_config['s'],
-                microsecond=0
+        if mode == "每隔" and (previous is None or previous <= after):
+            return after + timedelta(
+                hours=time_config['h'],
+                minutes=time_config['m'],
+                seconds=time_config['s']
             )
-            if target_today < now:
-                target_today += timedelta(days=1)
-            self.time_left = target_today - now
-
-        elif mode == "每隔":
-            if now >= self.target_time:
-                self.execute_action()
-                # 計算下一個執行時間
-                interval = timedelta(
-                    hours=self.settings['time']['h'],
-                    minutes=self.settings['time']['m'],
-                    seconds=self.settings['time']['s']
-                )
-                self.target_time = datetime.now() + interval
 
-            self.time_left = self.target_time - now
-            if self.time_left.total_seconds() < 0:
-                self.time_left = timedelta(0)
+        return previous if previous is not None and previous > after else None
+
+    def _arm_wake_alarm(self):
+        """休眠前為下一次執行時間設定 RTC 喚醒，回傳是否成功"""
+        now = datetime.now(timezone.utc)
+        wake_time = self.next_fire_time(now + timedelta(seconds=1), self.target_time)
+        if wake_time is None:
+            return True
+        if self.settings['remind']:
+            # 提早喚醒以便顯示一分鐘前的提醒
+            wake_time = max(wake_time - timedelta(seconds=60), now + timedelta(seconds=5))
+        self.wake_armed = self.wake_alarm.program(wake_time)
+        return self.wake_armed
+
+    def _disarm_wake_alarm(self):
+        """清除由本程式設定的 RTC 喚醒"""
+        if self.wake_armed:
+            self.wake_alarm.clear()
+            self.wake_armed = False
+
+    def _detect_resume(self, now):
+        """比較牆上時間與單調時間，偵測系統是否剛從休眠喚醒"""
+        mono = time.monotonic()
+        if self.last_tick is not None:
+            wall_elapsed = (now - self.last_tick[0]).total_seconds()
+            if wall_elapsed - (mono - self.last_tick[1]) > self.RESUME_THRESHOLD:
+                self._reconcile_after_resume(now)
+        self.last_tick = (now, mono)
+
+    def _reconcile_after_resume(self, now):
+        """喚醒後清除殘留的 RTC 鬧鐘，並處理休眠期間錯過的執行時間
+
+        剛錯過 (在寬限時間內) 的執行會在本次 tick 補執行一次；錯過太久的
+        則不再執行，避免例如晚上排定的關機在隔天早上一開機就被觸發。
+        """
+        self._disarm_wake_alarm()
+        grace = timedelta(seconds=self.MISSED_FIRE_GRACE + self.settings.get('slack', 0))
+        if self.target_time is None or now - self.target_time <= grace:
+            return
+
+        task = self.settings['task']
+        missed = self.target_time
+        if self.settings['mode'] in self.REPEATING_MODES:
+            self.target_time = self.next_fire_time(now, self.target_time)
+            print(f"略過休眠期間錯過的執行: {task} ({missed.isoformat()})")
+        else:
+            self.stop()
+            messagebox.showwarning("錯過執行時間",
+                f"系統休眠期間錯過了 '{task}' 的執行時間，任務已取消。")
 
     def _check_reminder(self):
         """檢查是否需要發送提醒"""
@@ -296,53 +1351,651 @@ class Scheduler:
             task = self.settings['task']
             messagebox.showinfo("任務提醒", f"任務 '{task}' 將在 1 分鐘後執行。")
 
+    def _warm_sound(self):
+        """鬧鐘觸發前不久才啟動播放器，避免長時間占用音效裝置"""
+        if (self.settings['task'] == "鬧鐘" and
+            not self.sound_warmed and
+            self.time_left.total_seconds() <= self.SOUND_WARM_LEAD):
+            self.sound_warmed = True
+            self.app.action_executor.warm_sound()
+
     def _should_execute(self):
         """檢查是否應該執行任務"""
-        return (self.settings['mode'] != "每隔" and
+        return (self.settings['mode'] not in self.REPEATING_MODES and
                 self.time_left.total_seconds() <= 0)
 
     def execute_action(self):
         """執行排程任務"""
-        action = self.settings['task']
-        desktop_env = self.settings['desktop_env']
+        if self.settings['task'] == "任務流程":
+            self._start_graph()
+        else:
+            # 觸發後播放器交由鬧鐘視窗的「停止鬧鐘」或播放結束自行結束，stop() 不再釋放
+            self.sound_warmed = False
+            self._dispatch(self.settings)
+
+    def graph_running(self):
+        """是否有任務流程仍在背景執行 (包含已取消但步驟尚未結束的流程)"""
+        return self.graph_thread is not None and self.graph_thread.is_alive()
+
+    def _start_graph(self):
+        """在背景執行緒執行任務流程，避免阻塞介面"""
+        if self.graph_running():
+            return  # 上一次的任務流程尚未結束
+
+        graph = TaskGraph(self.settings['graph'], self.settings.get('graph_workers', 4))
+
+        def run():
+            graph.run(self._run_graph_step)
+            self.last_graph_report = graph.report()
+            print(self.last_graph_report)
+            self.app.root.after(0, lambda: self._on_graph_finished(graph))
+
+        self.graph = graph
+        self.graph_thread = threading.Thread(target=run, daemon=True)
+        self.graph_thread.start()
+
+    def _on_graph_finished(self, graph):
+        """任務流程結束後 (於主執行緒)：回報失敗，單次模式則結束排程"""
+        if not graph.succeeded and not graph.cancelled:
+            messagebox.showwarning("任務流程", self.last_graph_report)
+        if (graph is self.graph and self.running and not graph.cancelled and
+                self.settings['mode'] not in self.REPEATING_MODES):
+            self.stop()
+
+    def _run_graph_step(self, step):
+        """執行任務流程中的單一步驟 (於工作執行緒中呼叫)
+
+        步驟只使用自己的欄位，介面上的音效檔、程式與指令設定不會帶入步驟。
+        """
+        settings = dict(step)
+        settings.setdefault('desktop_env', self.settings['desktop_env'])
+        if step['task'] in ("鬧鐘", "顯示訊息"):
+            # 介面相關的動作必須回到主執行緒執行
+            done = threading.Event()
+
+            def call():
+                try:
+                    self._dispatch(settings)
+                finally:
+                    done.set()
+
+            self.app.root.after(0, call)
+            done.wait()
+            return 0
+
+        if step['task'] == "休眠":
+            self._arm_wake_alarm()
+
+        custom_command = settings.get('custom_command')
+        if step['task'] == "執行程式":
+            custom_command = settings.get('exe_path')
+        return self.app.action_executor.run(
+            step['task'], desktop_env=settings['desktop_env'], custom_command=custom_command)
+
+    def _dispatch(self, settings):
+        """依設定執行單一動作"""
+        action = settings['task']
+        desktop_env = settings['desktop_env']
         executor = self.app.action_executor
 
         if action == "鬧鐘":
             self.app.show_alarm_window()
-            executor.play_sound(self.settings.get('sound_file'))
+            executor.play_sound(settings.get('sound_file'))
         elif action == "顯示訊息":
-            message = self.settings.get('message_text', '時間到！')
+            message = settings.get('message_text', '時間到！')
             messagebox.showinfo("排程訊息", message)
         elif action == "執行程式":
-            executor.execute(action, custom_command=self.settings.get('exe_path'))
+            executor.execute(action, custom_command=settings.get('exe_path'))
         elif action == "執行指令":
-            executor.execute(action, custom_command=self.settings.get('custom_command'))
+            executor.execute(action, custom_command=settings.get('custom_command'))
+        elif action == "休眠":
+            armed = self._arm_wake_alarm()
+            executor.execute(action, desktop_env=desktop_env)
+            if not armed:
+                messagebox.showwarning("喚醒設定失敗",
+                    "無法設定 RTC 喚醒鬧鐘，\n休眠期間排程將不會執行。")
         else:
             executor.execute(action, desktop_env=desktop_env)
 
 
+class HeadlessScheduler:
+    """不需圖形介面的排程核心，可同時執行多個任務並合併鄰近的喚醒
+
+    任務設定與 AutoSchedulerApp.get_current_settings() 的格式相同，
+    另可加上 'slack' (秒) 表示可延後執行的容許誤差，
+    以及 'delay' (秒) 表示每次執行都延後固定的時間 (機群錯開執行用)。
+    """
+
+    # 不需要圖形介面即可執行的任務 (顯示訊息改用 notify-send)
+    HEADLESS_TASKS = ["關機", "重新開機", "休眠", "登出", "關閉螢幕",
+                      "執行程式", "執行指令", "顯示訊息"]
+
+    # 單次等待的上限 (秒)。等待逾時以單調時間計算，休眠期間不會前進，
+    # 因此必須定期醒來比對牆上時間才能偵測喚醒
+    MAX_IDLE_WAIT = 60
+
+    def __init__(self, jobs, executor=None, tasks=None, wake_alarm=None):
+        self.tasks = tasks or self.HEADLESS_TASKS
+        self.jobs = self.validate(jobs, self.tasks)
+        self.executor = executor or ActionExecutor()
+        self.wake_alarm = wake_alarm or WakeAlarm()
+        self.wake_armed = False
+        self.timers = TimerQueue()
+        self.deadlines = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.failures = 0
+        self.workers = []
+
+    @classmethod
+    def from_file(cls, path):
+        """從 JSON 檔載入任務清單"""
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def validate(cls, jobs, tasks=None):
+        """檢查任務清單並回傳 slack/delay 正規化為數字的副本，有錯誤時拋出 ValueError
+
+        tasks 為允許的任務 (預設為 HEADLESS_TASKS)；控制端推送前也用來檢查任務清單。
+        """
+        tasks = tasks or cls.HEADLESS_TASKS
+        if not isinstance(jobs, list):
+            raise ValueError("任務清單必須是陣列。")
+        now = datetime.now(timezone.utc)
+        validated = []
+        for job in jobs:
+            if not isinstance(job, dict) or job.get('task') not in tasks:
+                raise ValueError(f"不支援或不允許的任務: {job}")
+            if job.get('mode') not in ["指定時間", "倒數", "每天", "每隔"]:
+                raise ValueError(f"未知的時間模式: {job.get('mode')}")
+            if not isinstance(job.get('time'), dict):
+                raise ValueError("任務的 time 必須是物件。")
+            tz = job.get('tz')
+            if tz is not None and not isinstance(tz, str):
+                raise ValueError(f"未知的時區: {tz!r}")
+            try:
+                ZoneTransitions.for_settings(job)
+            except (KeyError, ValueError):
+                raise ValueError(f"未知的時區: {tz}")
+            try:
+                job = dict(job, slack=float(job.get('slack', 0)), delay=float(job.get('delay', 0)))
+                if not (job['slack'] >= 0 and job['delay'] >= 0):
+                    raise ValueError("slack 與 delay 不可為負數。")
+                timedelta(seconds=job['slack'] + job['delay'])
+                cls._next_deadline(job, now)
+            except (KeyError, TypeError, ValueError, OverflowError) as e:
+                raise ValueError(f"任務設定錯誤: {e!r}")
+            validated.append(job)
+        return validated
+
+    def set_jobs(self, jobs):
+        """替換整個任務清單 (可在執行中由其他執行緒呼叫)"""
+        jobs = self.validate(jobs, self.tasks)
+        with self.lock:
+            self.jobs = jobs
+            self.timers.timers.clear()
+            self.deadlines.clear()
+            now = datetime.now(timezone.utc)
+            for index in range(len(self.jobs)):
+                self._schedule(index, now)
+        self.wakeup.set()
+
+    @staticmethod
+    def _next_deadline(job, after, previous=None):
+        """計算任務的下一個截止時間 (UTC)，沒有下一次時回傳 None"""
+        mode = job['mode']
+        time_config = job['time']
+        duration = timedelta(
+            hours=time_config.get('h', 0),
+            minutes=time_config.get('m', 0),
+            seconds=time_config.get('s', 0)
+        )
+
+        if mode == "每天":
+            return ZoneTransitions.for_settings(job).next_daily(
+                time_config['h'], time_config['m'], time_config['s'], after)
+
+        if mode == "每隔":
+            if duration <= timedelta(0):
+                raise ValueError("間隔時間必須大於 0。")
+            if previous is None:
+                return after + duration
+            # 以上一次的截止時間為基準避免累積誤差，錯過的次數直接略過
+            target = previous + duration
+            while target <= after:
+                target += duration
+            return target
+
+        if previous is not None:
+            return None  # 單次任務
+        if mode == "倒數":
+            return after + duration
+        return ZoneTransitions.for_settings(job).to_utc(datetime(
+            year=time_config['year'], month=time_config['month'],
+            day=time_config['day'], hour=time_config['h'],
+            minute=time_config['m'], second=time_config['s']))
+
+    def _schedule(self, index, after):
+        """為任務排入下一個截止時間"""
+        job = self.jobs[index]
+        deadline = self._next_deadline(job, after, self.deadlines.get(index))
+        if deadline is None:
+            self.deadlines.pop(index, None)
+            return
+        self.deadlines[index] = deadline
+        delay = timedelta(seconds=job.get('delay', 0))
+        self.timers.add(index, deadline + delay, job.get('slack', 0))
+
+    def _execute(self, job):
+        """在背景執行緒執行任務，避免長時間的指令延誤其他任務"""
+        task = job['task']
+        if task == "顯示訊息":
+            task, custom_command = "執行指令", shlex.join(
+                ["notify-send", "排程訊息", job.get('message_text', '時間到！')])
+        elif task == "執行程式":
+            custom_command = job.get('exe_path')
+        else:
+            custom_command = job.get('custom_command')
+
+        def run():
+            try:
+                self.executor.run(task, desktop_env=job.get('desktop_env', "GNOME"),
+                                  custom_command=custom_command)
+            except (OSError, ValueError) as e:
+                print(f"任務 '{job['task']}' 執行失敗: {e}", file=sys.stderr)
+
+        # 保留執行緒以便 run() 結束前等待，否則程式結束時指令可能還沒啟動就被中止
+        self.workers = [worker for worker in self.workers if worker.is_alive()]
+        worker = threading.Thread(target=run, daemon=True)
+        self.workers.append(worker)
+        worker.start()
+
+    def _arm_wake_alarm(self, exclude):
+        """休眠前把 RTC 設為最早的下一個截止時間 (不含休眠任務本身)"""
+        deadlines = [deadline for key, (deadline, _) in self.timers.timers.items()
+                     if key not in exclude]
+        if not deadlines:
+            return
+        self.wake_armed = self.wake_alarm.program(min(deadlines))
+        if not self.wake_armed:
+            print("無法設定 RTC 喚醒鬧鐘，休眠期間排程將不會執行。", file=sys.stderr)
+
+    def _disarm_wake_alarm(self):
+        """清除由本程式設定的 RTC 喚醒"""
+        if self.wake_armed:
+            self.wake_alarm.clear()
+            self.wake_armed = False
+
+    def _detect_resume(self, now, last_pass):
+        """比較牆上時間與單調時間，偵測系統是否剛從休眠喚醒，回傳本次的 (牆上, 單調) 時間"""
+        mono = time.monotonic()
+        if last_pass is not None:
+            wall_elapsed = (now - last_pass[0]).total_seconds()
+            if wall_elapsed - (mono - last_pass[1]) > Scheduler.RESUME_THRESHOLD:
+                self._reconcile_after_resume(now)
+        return now, mono
+
+    def _reconcile_after_resume(self, now):
+        """清除 RTC 喚醒，並略過休眠期間錯過太久的執行 (規則與 Scheduler 相同)"""
+        self._disarm_wake_alarm()
+        for index, (deadline, slack) in list(self.timers.timers.items()):
+            grace = timedelta(seconds=Scheduler.MISSED_FIRE_GRACE + slack)
+            if now - deadline <= grace:
+                continue
+            self.timers.remove(index)
+            print(f"略過休眠期間錯過的執行: {self.jobs[index]['task']} ({deadline.isoformat()})")
+            self._schedule(index, now)
+
+    def run(self, wait_forever=False):
+        """執行排程直到呼叫 stop()；wait_forever 為 False 時所有任務結束即返回"""
+        with self.lock:
+            now = datetime.now(timezone.utc)
+            for index in range(len(self.jobs)):
+                if index not in self.deadlines:
+                    self._schedule(index, now)
+            last_pass = self._detect_resume(now, None)
+
+        timer_slack = 0
+        while not self.stopped:
+            with self.lock:
+                window = self.timers.next_window()
+            if window is None and not wait_forever:
+                break
+
+            timeout = self.MAX_IDLE_WAIT
+            if window is not None:
+                # 等到區間開始，並以區間寬度作為 timer slack，讓核心在區間內
+                # 與其他計時器合併喚醒；不再額外延後，避免超過任務的容許誤差
+                start, end = window
+                slack = (end - start).total_seconds()
+                if slack != timer_slack:
+                    set_timer_slack(slack)  # 設為 0 時核心會恢復預設值
+                    timer_slack = slack
+                timeout = min(timeout, max(
+                    0.0, (start - datetime.now(timezone.utc)).total_seconds()))
+            self.wakeup.wait(timeout)
+            self.wakeup.clear()
+
+            with self.lock:
+                now = datetime.now(timezone.utc)
+                last_pass = self._detect_resume(now, last_pass)
+                due = self.timers.pop_due(now)
+                # 休眠任務最後執行：其他任務都排好下一次後，才能決定 RTC 喚醒時間
+                suspends = [index for index in due if self.jobs[index]['task'] == "休眠"]
+                for index in sorted(due, key=lambda index: index in suspends):
+                    try:
+                        self._schedule(index, now)
+                        if index in suspends:
+                            self._arm_wake_alarm(exclude=suspends)
+                        self._execute(self.jobs[index])
+                    except Exception as e:
+                        # 單一任務出錯時停用該任務，不影響其他任務的排程
+                        self.failures += 1
+                        self.timers.remove(index)
+                        self.deadlines.pop(index, None)
+                        print(f"任務 '{self.jobs[index]['task']}' 排程失敗，已停用: {e!r}",
+                              file=sys.stderr)
+
+        for worker in list(self.workers):
+            worker.join()
+        self._disarm_wake_alarm()
+
+    def stop(self):
+        """停止排程"""
+        self.stopped = True
+        self.wakeup.set()
+
+    def status(self):
+        """回傳目前的任務數、下一次喚醒時間與喚醒統計"""
+        with self.lock:
+            window = self.timers.next_window()
+            return {
+                'jobs': len(self.jobs),
+                'next_wakeup': window[0].isoformat() if window else None,
+                'wakeups': self.timers.wakeups,
+                'fired': self.timers.fired,
+                'wakeups_saved': self.timers.wakeups_saved,
+                'failures': self.failures,
+            }
+
+    def report(self):
+        """回傳喚醒統計"""
+        return (f"喚醒 {self.timers.wakeups} 次，執行 {self.timers.fired} 個截止時間，"
+                f"合併省下 {self.timers.wakeups_saved} 次喚醒")
+
+
+class FleetAgent:
+    """機群代理程式：接收控制端推送的任務清單，交給無介面排程核心執行
+
+    協定為每行一個 JSON 請求/回應，同一連線可連續送出多個請求 (管線化)，
+    回應依請求順序傳回。每個請求都必須帶有正確的 token。
+    預設只接受電源相關的任務；allow_commands 為 True 時才允許執行程式、
+    執行指令與顯示訊息。
+    """
+
+    DEFAULT_PORT = 7341
+    MAX_REQUEST_SIZE = 1024 * 1024
+
+    # 未允許執行指令時可接受的任務
+    POWER_TASKS = ["關機", "重新開機", "休眠", "登出", "關閉螢幕"]
+
+    class _Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    def __init__(self, address, token, executor=None, allow_commands=False):
+        if not token:
+            raise ValueError("代理程式必須設定存取權杖 (--token)。")
+        self.token = token
+        tasks = HeadlessScheduler.HEADLESS_TASKS if allow_commands else self.POWER_TASKS
+        self.scheduler = HeadlessScheduler([], executor, tasks=tasks)
+        self.scheduler_thread = None
+        agent = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                while True:
+                    line = self.rfile.readline(agent.MAX_REQUEST_SIZE)
+                    if not line:
+                        return
+                    if not line.endswith(b"\n"):
+                        self._reply({'ok': False, 'error': "請求過大"})
+                        return
+                    self._reply(agent.handle_request(line))
+
+            def _reply(self, response):
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode() + b"\n")
+
+        self.server = self._Server(address, Handler)
+
+    @property
+    def address(self):
+        """實際監聽的位址 (port 為 0 時由系統分配)"""
+        return self.server.server_address
+
+    def handle_request(self, line):
+        """處理單一請求並回傳回應"""
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            return {'ok': False, 'error': "無法解析的請求"}
+
+        request_id = request.get('id')
+        token = str(request.get('token', ''))
+        if not hmac.compare_digest(token.encode(), self.token.encode()):
+            return {'id': request_id, 'ok': False, 'error': "權杖錯誤"}
+
+        command = request.get('cmd')
+        try:
+            if command == "ping":
+                result = {}
+            elif command == "set_jobs":
+                self.scheduler.set_jobs(request.get('jobs', []))
+                result = {'jobs': len(self.scheduler.jobs)}
+            elif command == "clear":
+                self.scheduler.set_jobs([])
+                result = {}
+            elif command == "status":
+                result = self.scheduler.status()
+            else:
+                raise ValueError(f"未知的指令: {command}")
+        except (TypeError, ValueError) as e:
+            return {'id': request_id, 'ok': False, 'error': str(e)}
+        return dict(result, id=request_id, ok=True)
+
+    def serve_forever(self):
+        """啟動排程並處理連線，直到呼叫 shutdown()"""
+        self.scheduler_thread = threading.Thread(
+            target=self.scheduler.run, kwargs={'wait_forever': True}, daemon=True)
+        self.scheduler_thread.start()
+        self.server.serve_forever()
+
+    def start(self):
+        """在背景執行緒執行 serve_forever()"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def shutdown(self):
+        """停止 serve_forever() 並釋放資源"""
+        self.server.shutdown()
+        self.close()
+
+    def close(self):
+        """關閉監聽的 socket 並停止排程"""
+        self.server.server_close()
+        self.scheduler.stop()
+
+
+class AgentConnection:
+    """與單一代理程式的持久連線"""
+
+    def __init__(self, host, port, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.sock = None
+        self.reader = None
+
+    def send(self, requests):
+        """一次送出多個請求 (不等待回應)"""
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port), self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.reader = self.sock.makefile("rb")
+        payload = b"".join(json.dumps(r, ensure_ascii=False).encode() + b"\n" for r in requests)
+        self.sock.sendall(payload)
+
+    def receive(self, count):
+        """依序讀取 count 個回應"""
+        responses = []
+        for _ in range(count):
+            line = self.reader.readline()
+            if not line:
+                raise ConnectionError("代理程式已關閉連線")
+            responses.append(json.loads(line))
+        return responses
+
+    def close(self):
+        """關閉連線"""
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+
+class FleetController:
+    """機群控制端：透過連線池與管線化的批次指令，把任務清單推送到多台代理程式"""
+
+    # 同時連線與收發的主機數上限
+    MAX_PARALLEL = 256
+
+    def __init__(self, hosts, token, timeout=10):
+        self.hosts = list(hosts)
+        self.token = token
+        self.timeout = timeout
+        self.pool = {}
+
+    @classmethod
+    def from_file(cls, path, token):
+        """從主機清單檔載入 (每行一個 host[:port]，# 開頭為註解)"""
+        with open(path, encoding="utf-8") as f:
+            hosts = [line.strip() for line in f
+                     if line.strip() and not line.strip().startswith("#")]
+        return cls(hosts, token)
+
+    @staticmethod
+    def parse_address(address, default_host="127.0.0.1"):
+        """把 "host:port"、"host" 或 "port" 解析成 (host, port)"""
+        host, _, port = address.rpartition(":")
+        if not host:
+            if port.isdigit():
+                return default_host, int(port)
+            return port, FleetAgent.DEFAULT_PORT
+        return host, int(port)
+
+    def _connection(self, host):
+        """取得連線池中的連線 (需要時才建立)"""
+        if host not in self.pool:
+            self.pool[host] = AgentConnection(*self.parse_address(host), timeout=self.timeout)
+        return self.pool[host]
+
+    def batch(self, commands):
+        """對每台主機送出一批指令，回傳 {主機: [回應, ...]}
+
+        各主機的連線、送出與讀取回應在執行緒池中並行進行，
+        總耗時約為最慢的一台而非所有主機的總和。
+        """
+        connections = {host: self._connection(host) for host in commands}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.MAX_PARALLEL, len(commands)))) as pool:
+            futures = {host: pool.submit(self._exchange, connections[host], host_commands)
+                       for host, host_commands in commands.items()}
+        return {host: future.result() for host, future in futures.items()}
+
+    def _exchange(self, connection, commands):
+        """對單一主機管線化送出指令並讀取回應
+
+        連線池中的舊連線失效時重新連線再試一次；新建立的連線失敗表示
+        主機無法連線，直接回報錯誤而不重試。
+        """
+        requests = [dict(command, id=i, token=self.token) for i, command in enumerate(commands)]
+        while True:
+            reused = connection.sock is not None
+            try:
+                connection.send(requests)
+                return connection.receive(len(requests))
+            except (OSError, ValueError) as e:
+                connection.close()
+                if not reused:
+                    return [{'ok': False, 'error': str(e)}]
+
+    def push(self, jobs, stagger=0):
+        """推送任務清單；stagger 秒內平均錯開各主機的執行時間，避免同時開關機造成電源突波
+
+        任務清單先在本機檢查，格式錯誤時拋出 ValueError 而不會送出。
+        """
+        jobs = HeadlessScheduler.validate(jobs)
+        commands = {}
+        for index, host in enumerate(self.hosts):
+            delay = stagger * index / len(self.hosts)
+            host_jobs = [dict(job, delay=job.get('delay', 0) + delay) for job in jobs]
+            commands[host] = [{'cmd': "set_jobs", 'jobs': host_jobs}]
+        return self.batch(commands)
+
+    def status(self):
+        """查詢所有主機的狀態"""
+        return self.batch({host: [{'cmd': "status"}] for host in self.hosts})
+
+    def close(self):
+        """關閉連線池中的所有連線"""
+        for connection in self.pool.values():
+            connection.close()
+        self.pool.clear()
+
+
 # --- 使用者介面類別 ---
 
 class AutoSchedulerApp:
     """主應用程式類別"""
 
-    def __init__(self, root):
+    def __init__(self, root, minimized=False, settings_store=None, profiler=None,
+                 profile_path=None):
         self.root = root
         self.root.title("Power Scheduler for Linux")
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        self.root.bind("<Map>", self._on_map)
+
+        # 完整視窗的容器；常駐模式下直到第一次開啟時才建立
+        self.window = None
+        self.indicator_label = None
 
         # 初始化核心元件
         self.scheduler = Scheduler(self)
         self.action_executor = ActionExecutor()
         self.autostart_manager = AutostartManager()
+        self.settings_store = settings_store or SettingsStore()
+
+        # 效能分析 (--profile 或 Ctrl+Alt+P 切換)
+        self.profiler = profiler or Profiler()
+        self.profile_path = profile_path
+        self._register_profiling_targets()
+        self.root.bind_all("<Control-Alt-p>", self.toggle_profiling)
 
         # 初始化 UI 變數
         self._init_variables()
 
         # 建立介面
-        self.create_widgets()
-        self.update_time_inputs_visibility()
-        self.update_status_display()
+        if minimized:
+            self._create_indicator()
+            self._restore_last_job()
+        else:
+            self.window = self.root
+            self.create_widgets()
+            self.update_time_inputs_visibility()
+            self.update_status_display()
 
     def _init_variables(self):
         """初始化 UI 變數"""
@@ -352,15 +2005,132 @@ class AutoSchedulerApp:
         self.remind_before_1_min = tk.BooleanVar()
         self.start_with_os = tk.BooleanVar(value=self.autostart_manager.is_enabled())
         self.desktop_env = tk.StringVar()
+        self.time_zone = tk.StringVar(value=ZoneTransitions.local_zone_name())
 
         # 進階設定變數
         self.alarm_sound_file = tk.StringVar()
         self.message_text = tk.StringVar(value="時間到了！")
         self.exe_path = tk.StringVar()
         self.custom_command = tk.StringVar()
+        self.graph_file = tk.StringVar()
+        self.slack_seconds = tk.IntVar(value=0)
 
         self.detect_desktop_env()
 
+    def _register_profiling_targets(self):
+        """登記排程與介面的熱門路徑"""
+        self.profiler.register(self.scheduler, [
+            "tick", "_update_time_left", "_check_reminder", "_next_tick_delay",
+            "execute_action", "_dispatch"])
+        self.profiler.register(self, [
+            "update_status_display", "update_ui_for_running_state",
+            "_toggle_settings_widgets", "create_widgets"])
+        self.profiler.register(self.action_executor, ["execute", "play_sound"])
+        self.profiler.register(messagebox, ["showinfo", "showwarning", "showerror"])
+
+    def toggle_profiling(self, event=None):
+        """切換效能分析，停止時輸出記錄檔"""
+        if not self.profiler.enabled:
+            messagebox.showinfo("效能分析", "開始記錄，再按一次 Ctrl+Alt+P 停止並輸出。")
+            self.profiler.enable()
+            return
+        self.profiler.disable()
+        path = self.profile_path or Profiler.default_path()
+        try:
+            self.profiler.dump(path)
+            messagebox.showinfo("效能分析", f"已輸出效能記錄:\n{os.path.abspath(path)}")
+        except OSError as e:
+            messagebox.showerror("錯誤", f"無法輸出效能記錄：\n{e}")
+
+    def _create_indicator(self):
+        """建立常駐模式的精簡狀態指示器"""
+        self.root.title("Power Scheduler")
+        self.root.resizable(False, False)
+        frame = ttk.Frame(self.root, padding="5")
+        frame.pack()
+        self.indicator_label = ttk.Label(frame, text="尚未執行", foreground="grey")
+        self.indicator_label.pack(side=tk.LEFT, padx=5)
+        ttk.Button(frame, text="開啟", command=self.open_main_window).pack(side=tk.LEFT)
+        self.root.iconify()
+
+    def open_main_window(self):
+        """開啟完整視窗，元件在第一次開啟時才建立"""
+        if self.window is not None:
+            self.window.deiconify()
+            self.window.lift()
+            return
+
+        self.window = tk.Toplevel(self.root)
+        self.window.title("Power Scheduler for Linux")
+        self.window.protocol("WM_DELETE_WINDOW", self.close_main_window)
+        self.window.bind("<Map>", self._on_map)
+
+        self.create_widgets()
+        if self.scheduler.settings:
+            self._load_time_settings(self.scheduler.settings)
+        self.update_time_inputs_visibility()
+        self.update_ui_for_running_state(self.scheduler.running)
+        self.update_pause_button(self.scheduler.paused)
+        self.update_status_display()
+        self.scheduler.refresh()
+
+    def close_main_window(self):
+        """關閉完整視窗並釋放其元件，排程繼續在背景執行"""
+        self.window.destroy()
+        self.window = None
+        self.time_frames = {}
+
+    def _restore_last_job(self):
+        """常駐模式啟動時恢復上次的排程 (倒數與已過期的指定時間除外)"""
+        settings = self.settings_store.load()
+        if not settings or settings.get('mode') not in ["指定時間", "每天", "每隔"]:
+            return
+        try:
+            zone = ZoneTransitions.for_settings(settings)
+        except (KeyError, ValueError):
+            return
+
+        if settings['mode'] == "指定時間":
+            time_config = settings['time']
+            try:
+                target = zone.to_utc(datetime(
+                    year=time_config['year'],
+                    month=time_config['month'],
+                    day=time_config['day'],
+                    hour=time_config['h'],
+                    minute=time_config['m'],
+                    second=time_config['s']
+                ))
+            except (ValueError, OverflowError):
+                return
+            if target <= datetime.now(timezone.utc):
+                return
+
+        self._load_variables(settings)
+        self.scheduler.start(settings)
+
+    def _load_variables(self, settings):
+        """把保存的設定寫回 UI 變數"""
+        self.selected_task.set(settings['task'])
+        self.schedule_mode.set(settings['mode'])
+        self.desktop_env.set(settings['desktop_env'])
+        self.time_zone.set(settings.get('tz') or ZoneTransitions.local_zone_name())
+        self.remind_before_1_min.set(settings['remind'])
+        self.alarm_sound_file.set(settings.get('sound_file', ''))
+        self.message_text.set(settings.get('message_text', ''))
+        self.exe_path.set(settings.get('exe_path', ''))
+        self.custom_command.set(settings.get('custom_command', ''))
+        self.graph_file.set(settings.get('graph_file', ''))
+        self.slack_seconds.set(settings.get('slack', 0))
+
+    def _load_time_settings(self, settings):
+        """把保存的時間設定寫回對應模式的輸入框"""
+        frame = self.time_frames[settings['mode']]
+        variables = dict(frame.time_vars, **getattr(frame, 'dt_vars', {}))
+        for key, value in settings['time'].items():
+            if key in variables:
+                variables[key].set(value)
+
     def create_widgets(self):
         """建立使用者介面元件"""
         self._create_status_frame()
@@ -371,7 +2141,7 @@ class AutoSchedulerApp:
 
     def _create_status_frame(self):
         """建立狀態顯示區域"""
-        top_frame = ttk.Frame(self.root, padding="10")
+        top_frame = ttk.Frame(self.window, padding="10")
         top_frame.grid(row=0, column=0, columnspan=2, sticky="ew")
         ttk.Label(top_frame, text="狀態:").pack(side=tk.LEFT)
         self.status_label = ttk.Label(
@@ -384,7 +2154,7 @@ class AutoSchedulerApp:
 
     def _create_task_selection_frame(self):
         """建立任務選擇區域"""
-        left_frame = ttk.LabelFrame(self.root, text="1. 選擇任務", padding="10")
+        left_frame = ttk.LabelFrame(self.window, text="1. 選擇任務", padding="10")
         left_frame.grid(row=1, column=0, padx=10, pady=10, sticky="ns")
 
         # 基本任務選項
@@ -402,7 +2172,8 @@ class AutoSchedulerApp:
             ("鬧鐘", self.settings_for_alarm),
             ("顯示訊息", self.settings_for_message),
             ("執行程式", self.settings_for_exe),
-            ("執行指令", self.settings_for_command)
+            ("執行指令", self.settings_for_command),
+            ("任務流程", self.settings_for_graph)
         ]
 
         for i, (task_name, settings_func) in enumerate(advanced_tasks):
@@ -441,7 +2212,7 @@ class AutoSchedulerApp:
 
     def _create_time_setting_frame(self):
         """建立時間設定區域"""
-        right_frame = ttk.LabelFrame(self.root, text="2. 設定時間", padding="10")
+        right_frame = ttk.LabelFrame(self.window, text="2. 設定時間", padding="10")
         right_frame.grid(row=1, column=1, padx=10, pady=10, sticky="nsew")
 
         # 時間模式選擇
@@ -459,6 +2230,18 @@ class AutoSchedulerApp:
         self.time_frames = {}
         self._create_time_input_frames(right_frame)
 
+        # 容許誤差 (視窗縮小時可合併喚醒以節省電力)
+        slack_frame = ttk.Frame(right_frame)
+        slack_frame.pack(side=tk.BOTTOM, anchor="w", pady=5)
+        ttk.Label(slack_frame, text="容許誤差:").pack(side=tk.LEFT)
+        ttk.Combobox(
+            slack_frame,
+            textvariable=self.slack_seconds,
+            values=[0, 5, 30, 60, 300],
+            width=4
+        ).pack(side=tk.LEFT)
+        ttk.Label(slack_frame, text="秒").pack(side=tk.LEFT)
+
     def _create_time_input_frames(self, parent):
         """建立各種時間輸入框架"""
         self.time_frames["指定時間"] = self.create_time_input_frame(parent, show_ymd=True)
@@ -468,7 +2251,7 @@ class AutoSchedulerApp:
 
     def _create_environment_frame(self):
         """建立環境設定區域"""
-        settings_frame = ttk.LabelFrame(self.root, text="3. 環境設定", padding="10")
+        settings_frame = ttk.LabelFrame(self.window, text="3. 環境設定", padding="10")
         settings_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
 
         ttk.Label(settings_frame, text="桌面環境:").pack(side=tk.LEFT, padx=5)
@@ -482,9 +2265,17 @@ class AutoSchedulerApp:
         self.desktop_combobox.pack(side=tk.LEFT, padx=5)
         ttk.Label(settings_frame, text="(用於'登出'功能)").pack(side=tk.LEFT, padx=5)
 
+        ttk.Label(settings_frame, text="時區:").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(
+            settings_frame,
+            textvariable=self.time_zone,
+            values=sorted(available_timezones()),
+            width=20
+        ).pack(side=tk.LEFT, padx=5)
+
     def _create_control_buttons(self):
         """建立控制按鈕區域"""
-        bottom_frame = ttk.Frame(self.root, padding="10")
+        bottom_frame = ttk.Frame(self.window, padding="10")
         bottom_frame.grid(row=3, column=0, columnspan=2, sticky="ew", pady=10)
 
         self.execute_button = ttk.Button(
@@ -603,22 +2394,37 @@ class AutoSchedulerApp:
     def update_status_display(self, time_left=None):
         """更新狀態顯示"""
         if not self.scheduler.running:
-            self.status_label.config(text="尚未執行", foreground="grey")
+            self._set_status("尚未執行", "grey")
             return
 
         if self.scheduler.paused:
-            self.status_label.config(text="已暫停", foreground="orange")
+            self._set_status("已暫停", "orange")
             return
 
         task = self.scheduler.settings['task']
         if time_left:
             time_str = self._format_time_left(time_left)
-            self.status_label.config(
-                text=f"將在 {time_str} 後 {task}",
-                foreground="blue"
-            )
+            self._set_status(f"將在 {time_str} 後 {task}", "blue")
         else:
-            self.status_label.config(text=f"執行中: {task}", foreground="green")
+            self._set_status(f"執行中: {task}", "green")
+
+    def _set_status(self, text, color):
+        """更新完整視窗與常駐指示器上的狀態文字"""
+        if self.window is not None:
+            self.status_label.config(text=text, foreground=color)
+        if self.indicator_label is not None:
+            self.indicator_label.config(text=text, foreground=color)
+            self.root.title(f"Power Scheduler - {text}")
+
+    def is_status_visible(self):
+        """狀態列是否顯示在畫面上 (視窗縮小時不需每秒更新)"""
+        window = self.window if self.window is not None else self.root
+        return bool(window.winfo_viewable()) and window.state() != "iconic"
+
+    def _on_map(self, event):
+        """視窗重新顯示時立即更新倒數"""
+        if event.widget in (self.root, self.window):
+            self.scheduler.refresh()
 
     def _format_time_left(self, time_left):
         """格式化剩餘時間顯示"""
@@ -629,6 +2435,8 @@ class AutoSchedulerApp:
 
     def update_ui_for_running_state(self, is_running):
         """更新 UI 元件的啟用/停用狀態"""
+        if self.window is None:
+            return
         state = "disabled" if is_running else "normal"
 
         # 更新按鈕狀態
@@ -639,9 +2447,14 @@ class AutoSchedulerApp:
         # 鎖定/解鎖設定選項
         self._toggle_settings_widgets(state)
 
+    def update_pause_button(self, paused):
+        """更新暫停按鈕文字"""
+        if self.window is not None:
+            self.pause_button.config(text="繼續" if paused else "暫停")
+
     def _toggle_settings_widgets(self, state):
         """切換設定元件的啟用狀態"""
-        for child in self.root.winfo_children():
+        for child in self.window.winfo_children():
             if isinstance(child, ttk.LabelFrame):
                 for widget in child.winfo_children():
                     if widget not in self.time_frames.values():
@@ -673,12 +2486,15 @@ class AutoSchedulerApp:
             'mode': mode,
             'time': dict(frame.time_vars),
             'desktop_env': self.desktop_env.get(),
+            'tz': self.time_zone.get(),
             'remind': self.remind_before_1_min.get(),
             'startup': self.start_with_os.get(),
             'sound_file': self.alarm_sound_file.get(),
             'message_text': self.message_text.get(),
             'exe_path': self.exe_path.get(),
-            'custom_command': self.custom_command.get()
+            'custom_command': self.custom_command.get(),
+            'graph_file': self.graph_file.get(),
+            'slack': self.slack_seconds.get()
         }
 
         # 加入日期設定 (指定時間模式)
@@ -695,10 +2511,15 @@ class AutoSchedulerApp:
         """執行排程任務"""
         settings = self.get_current_settings()
 
+        if self.scheduler.graph_running():
+            messagebox.showwarning("任務流程", "上一次的任務流程仍在結束中，請稍後再執行。")
+            return
+
         # 驗證設定
         if not self._validate_settings(settings):
             return
 
+        self.settings_store.save(settings)
         self.scheduler.start(settings)
 
     def _validate_settings(self, settings):
@@ -708,11 +2529,32 @@ class AutoSchedulerApp:
             if time_config['h'] == 0 and time_config['m'] == 0 and time_config['s'] == 0:
                 messagebox.showwarning("無效設定", "倒數時間不能為 0。")
                 return False
+        try:
+            ZoneTransitions.for_settings(settings)
+        except (KeyError, ValueError):
+            messagebox.showwarning("無效設定", f"未知的時區: {settings['tz']}")
+            return False
+        if settings['task'] == "鬧鐘":
+            if not settings['sound_file'] or not os.path.exists(settings['sound_file']):
+                messagebox.showwarning("無效設定", "請先選擇存在的鬧鐘音效檔。")
+                return False
+        if settings['task'] == "任務流程":
+            if not settings['graph_file']:
+                messagebox.showwarning("無效設定", "請先選擇任務流程檔。")
+                return False
+            try:
+                graph = TaskGraph.from_file(settings['graph_file'])
+            except (OSError, ValueError) as e:
+                messagebox.showerror("任務流程錯誤", f"無法載入任務流程:\n{e}")
+                return False
+            settings['graph'] = list(graph.steps.values())
+            settings['graph_workers'] = graph.max_workers
         return True
 
     def reset_settings(self):
         """重設所有設定"""
         self.scheduler.stop()
+        self.settings_store.clear()
 
         # 重設變數
         self.selected_task.set("關機")
@@ -750,6 +2592,23 @@ class AutoSchedulerApp:
             self.exe_path.set(file_path)
             messagebox.showinfo("設定成功", f"已選擇程式:\n{file_path}")
 
+    def settings_for_graph(self):
+        """設定任務流程檔 (JSON)"""
+        file_path = filedialog.askopenfilename(
+            title="選擇任務流程檔",
+            filetypes=[("JSON Files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            graph = TaskGraph.from_file(file_path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("任務流程錯誤", f"無法載入任務流程:\n{e}")
+            return
+        self.graph_file.set(file_path)
+        messagebox.showinfo("設定成功",
+            f"已選擇任務流程:\n{file_path}\n共 {len(graph.steps)} 個步驟")
+
     def settings_for_command(self):
         """設定要執行的指令"""
         self._create_text_input_dialog(
@@ -814,16 +2673,150 @@ class AutoSchedulerApp:
 
     def on_closing(self):
         """程式關閉時的清理工作"""
-        self.action_executor.stop_sound()
+        self.action_executor.close()
         self.scheduler.stop()
         self.root.destroy()
 
 
+def probe_startup(minimized):
+    """建立介面後輸出啟動耗用的 CPU 時間與記憶體 (供啟動效能測試使用)"""
+    import resource
+
+    root = tk.Tk()
+    # 使用空的設定檔，避免測試時恢復並執行真正的排程
+    AutoSchedulerApp(root, minimized=minimized, settings_store=SettingsStore(os.devnull))
+    root.update()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    print(json.dumps({'cpu': usage.ru_utime + usage.ru_stime, 'maxrss_kb': usage.ru_maxrss}))
+    root.destroy()
+
+
+def benchmark_startup(runs):
+    """比較完整視窗與常駐模式的啟動耗用 (需要圖形環境)"""
+    script = os.path.abspath(__file__)
+    for label, extra_args in [("完整視窗", []), ("常駐模式", ["--minimized"])]:
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, script, "--probe-startup"] + extra_args,
+                capture_output=True, text=True, check=True
+            ).stdout
+            sample = json.loads(output)
+            sample['wall'] = time.perf_counter() - start
+            samples.append(sample)
+
+        rss = statistics.median(s['maxrss_kb'] for s in samples) / 1024
+        cpu = statistics.median(s['cpu'] for s in samples) * 1000
+        wall = statistics.median(s['wall'] for s in samples) * 1000
+        print(f"{label}: 記憶體 {rss:.1f} MB，CPU {cpu:.0f} ms，啟動時間 {wall:.0f} ms")
+
+
 def main():
     """主程式入口"""
+    parser = argparse.ArgumentParser(description="Power Scheduler for Linux")
+    parser.add_argument("--headless", metavar="JOBS",
+                        help="不開啟視窗，直接執行 JSON 檔中的任務清單")
+    parser.add_argument("--minimized", action="store_true",
+                        help="以常駐模式啟動，只顯示精簡的狀態指示器")
+    parser.add_argument("--benchmark-startup", metavar="N", type=int,
+                        help="比較完整視窗與常駐模式的啟動耗用 (各執行 N 次)")
+    parser.add_argument("--probe-startup", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--profile", metavar="PATH", nargs="?", const="",
+                        help="記錄排程與介面熱門路徑的耗時，結束時輸出 "
+                             "(.json 為 Chrome trace，其他副檔名為 collapsed stack)")
+    parser.add_argument("--agent", metavar="[HOST:]PORT",
+                        help="以機群代理程式模式執行，接收控制端推送的任務清單")
+    parser.add_argument("--allow-commands", action="store_true",
+                        help="代理程式也接受執行程式、執行指令與顯示訊息 (預設只接受電源相關的任務)")
+    parser.add_argument("--push", metavar="JOBS",
+                        help="把 JSON 任務清單推送到 --hosts 中的所有代理程式")
+    parser.add_argument("--fleet-status", action="store_true",
+                        help="查詢 --hosts 中所有代理程式的狀態")
+    parser.add_argument("--hosts", metavar="FILE",
+                        help="代理程式清單檔，每行一個 host[:port]")
+    parser.add_argument("--stagger", metavar="SECONDS", type=float, default=0,
+                        help="在此秒數內平均錯開各主機的執行時間")
+    parser.add_argument("--token", default=os.environ.get("POWER_SCHEDULER_TOKEN", ""),
+                        help="機群存取權杖 (預設讀取環境變數 POWER_SCHEDULER_TOKEN)")
+    args = parser.parse_args()
+
+    if args.agent:
+        try:
+            agent = FleetAgent(FleetController.parse_address(args.agent), args.token,
+                               allow_commands=args.allow_commands)
+        except ValueError as e:
+            parser.error(str(e))
+        host, port = agent.address[:2]
+        print(f"代理程式監聽於 {host}:{port}")
+        if os.geteuid() != 0:
+            print("警告: 代理程式不是以 root 執行，關機、重新開機與休眠會經由 pkexec，"
+                  "背景服務沒有 polkit 驗證代理程式，這些任務可能會失敗。", file=sys.stderr)
+        try:
+            agent.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        agent.close()
+        return
+
+    if args.push or args.fleet_status:
+        if not args.hosts:
+            parser.error("--push 與 --fleet-status 需要 --hosts")
+        controller = FleetController.from_file(args.hosts, args.token)
+        try:
+            if args.push:
+                with open(args.push, encoding="utf-8") as f:
+                    results = controller.push(json.load(f), stagger=args.stagger)
+            else:
+                results = controller.status()
+        except (OSError, ValueError) as e:
+            parser.error(f"無法推送任務清單: {e}")
+        finally:
+            controller.close()
+
+        failures = 0
+        for host in controller.hosts:
+            response = results[host][0]
+            if response.get('ok'):
+                details = {k: v for k, v in response.items() if k not in ('id', 'ok')}
+                print(f"{host}: 成功 {json.dumps(details, ensure_ascii=False)}")
+            else:
+                failures += 1
+                print(f"{host}: 失敗 - {response.get('error')}")
+        sys.exit(1 if failures else 0)
+
+    if args.benchmark_startup:
+        benchmark_startup(args.benchmark_startup)
+        return
+
+    if args.probe_startup:
+        probe_startup(args.minimized)
+        return
+
+    profiler = Profiler()
+    profile_path = args.profile or Profiler.default_path()
+    if args.profile is not None:
+        profiler.enable()
+
+    if args.headless:
+        scheduler = HeadlessScheduler.from_file(args.headless)
+        profiler.register(scheduler, ["_schedule", "_execute"])
+        profiler.register(scheduler.timers, ["next_window", "pop_due"])
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        print(scheduler.report())
+        if profiler.enabled:
+            profiler.dump(profile_path)
+        return
+
     root = tk.Tk()
-    app = AutoSchedulerApp(root)
+    app = AutoSchedulerApp(root, minimized=args.minimized, profiler=profiler,
+                           profile_path=args.profile or None)
     root.mainloop()
+    if profiler.enabled:
+        profiler.dump(profile_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,45 @@
+"""ActionExecutor 的指令解析與權限處理測試 (不實際執行任何指令)"""
+
+import unittest
+from unittest import mock
+
+import power_scheduler
+from power_scheduler import ActionExecutor, AlarmPlayer, NullSink
+
+
+class RunTest(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ActionExecutor(AlarmPlayer(sink=NullSink()))
+        patcher = mock.patch.object(power_scheduler.subprocess, "run",
+                                    return_value=mock.Mock(returncode=0))
+        self.run = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def command(self, action, uid, **kwargs):
+        with mock.patch.object(power_scheduler.os, "geteuid", return_value=uid):
+            self.executor.run(action, **kwargs)
+        return self.run.call_args.args[0]
+
+    def test_privileged_actions_use_pkexec_for_normal_users(self):
+        self.assertEqual(self.command("關機", 1000), ["pkexec", "systemctl", "poweroff"])
+        self.assertEqual(self.command("休眠", 1000), ["pkexec", "systemctl", "suspend"])
+
+    def test_root_runs_privileged_actions_directly(self):
+        self.assertEqual(self.command("重新開機", 0), ["systemctl", "reboot"])
+
+    def test_other_actions_never_use_pkexec(self):
+        self.assertEqual(self.command("登出", 1000, desktop_env="XFCE"),
+                         ["xfce4-session-logout", "--logout"])
+        self.assertEqual(self.command("執行指令", 1000, custom_command="echo 'a b'"),
+                         ["echo", "a b"])
+
+    def test_unknown_or_unparsable_commands_raise(self):
+        with self.assertRaises(ValueError):
+            self.executor.run("未知")
+        with self.assertRaises(ValueError):
+            self.executor.run("執行指令", custom_command="echo 'a")
+
+
+if __name__ == "__main__":
+    unittest.main()
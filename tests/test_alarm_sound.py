@@ -0,0 +1,166 @@
+"""鬧鐘音效快取、解碼上限與播放器生命週期的測試 (以 NullSink 取代真正的播放器)"""
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+import power_scheduler
+from power_scheduler import ActionExecutor, AlarmPlayer, NullSink, Scheduler, SoundCache
+
+
+def fake_decode(size):
+    return lambda path, limit: b"\0" * size
+
+
+class SoundFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def sound_file(self, name):
+        path = os.path.join(self.directory, name)
+        with open(path, "wb") as f:
+            f.write(b"RIFF")
+        return path
+
+
+class SoundCacheTest(SoundFiles):
+
+    def test_evicts_least_recently_used(self):
+        cache = SoundCache(max_bytes=10, decode=fake_decode(4))
+        a, b, c = (self.sound_file(name) for name in ("a.wav", "b.wav", "c.wav"))
+        cache.load(a)
+        cache.load(b)
+        cache.get(a)  # a 變成最近使用
+        cache.load(c)
+        self.assertIsNotNone(cache.get(a))
+        self.assertIsNone(cache.get(b))
+        self.assertIsNotNone(cache.get(c))
+        self.assertEqual(cache.size, 8)
+
+    def test_rejects_sound_over_limit(self):
+        cache = SoundCache(max_bytes=10, decode=fake_decode(11))
+        with self.assertRaises(ValueError):
+            cache.load(self.sound_file("long.wav"))
+        self.assertEqual(cache.size, 0)
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            SoundCache(decode=fake_decode(4)).load(os.path.join(self.directory, "none.wav"))
+
+    def fake_ffmpeg(self, size):
+        """在 PATH 前面放一個輸出 size 位元組的假 ffmpeg"""
+        bin_dir = os.path.join(self.directory, "bin")
+        os.mkdir(bin_dir)
+        script = os.path.join(bin_dir, "ffmpeg")
+        with open(script, "w", encoding="utf-8") as f:
+            f.write(f"#!/bin/sh\nhead -c {size} /dev/zero\n")
+        os.chmod(script, stat.S_IRWXU)
+        return mock.patch.dict(os.environ, {'PATH': bin_dir + os.pathsep + os.environ['PATH']})
+
+    def test_ffmpeg_decode_is_streamed(self):
+        with self.fake_ffmpeg(200000):
+            self.assertEqual(len(SoundCache(max_bytes=300000).load(self.sound_file("a.wav"))),
+                             200000)
+
+    def test_ffmpeg_decode_aborts_over_limit(self):
+        with self.fake_ffmpeg(50 * 1024 * 1024):
+            with self.assertRaises(ValueError):
+                SoundCache(max_bytes=100000).load(self.sound_file("a.wav"))
+
+
+class PlaySoundTest(SoundFiles):
+
+    def test_plays_cached_pcm_after_source_is_removed(self):
+        sink = NullSink()
+        executor = ActionExecutor(AlarmPlayer(SoundCache(decode=fake_decode(6)), sink))
+        path = self.sound_file("alarm.wav")
+        self.assertIsNone(executor.prepare_sound(path))
+        os.remove(path)
+        with mock.patch.object(power_scheduler.subprocess, "Popen") as popen, \
+             mock.patch.object(power_scheduler.messagebox, "showwarning") as warning:
+            executor.play_sound(path)
+        self.assertEqual(sink.played, [b"\0" * 6])
+        popen.assert_not_called()
+        warning.assert_not_called()
+
+    def test_prepare_does_not_start_player(self):
+        sink = NullSink()
+        executor = ActionExecutor(AlarmPlayer(SoundCache(decode=fake_decode(6)), sink))
+        executor.prepare_sound(self.sound_file("alarm.wav"))
+        self.assertFalse(sink.warmed)
+        executor.warm_sound()
+        self.assertTrue(sink.warmed)
+
+
+class FakeRoot:
+
+    def after(self, delay, callback):
+        return "job"
+
+    def after_cancel(self, job):
+        pass
+
+
+class FakeApp:
+
+    def __init__(self, executor):
+        self.root = FakeRoot()
+        self.action_executor = executor
+        self.alarm_windows = 0
+
+    def update_ui_for_running_state(self, running):
+        pass
+
+    def update_status_display(self, time_left=None):
+        pass
+
+    def update_pause_button(self, paused):
+        pass
+
+    def is_status_visible(self):
+        return False
+
+    def show_alarm_window(self):
+        self.alarm_windows += 1
+
+
+class SchedulerAlarmTest(SoundFiles):
+
+    def setUp(self):
+        super().setUp()
+        self.sink = NullSink()
+        self.player = AlarmPlayer(SoundCache(decode=fake_decode(6)), self.sink)
+        self.app = FakeApp(ActionExecutor(self.player))
+        self.scheduler = Scheduler(self.app, wake_alarm=mock.Mock())
+
+    def settings(self, seconds):
+        return {'task': "鬧鐘", 'mode': "倒數", 'desktop_env': "GNOME", 'remind': False,
+                'tz': "UTC", 'sound_file': self.sound_file("alarm.wav"),
+                'time': {'h': 0, 'm': 0, 's': seconds}}
+
+    def test_fired_alarm_is_not_released_on_stop(self):
+        settings = self.settings(0)
+        self.app.action_executor.prepare_sound(settings['sound_file'])  # 背景解碼可能尚未完成
+        with mock.patch.object(self.player, "close") as close:
+            self.scheduler.start(settings)
+        self.assertEqual(self.app.alarm_windows, 1)
+        self.assertEqual(self.sink.played, [b"\0" * 6])
+        self.assertFalse(self.scheduler.running)
+        self.assertTrue(self.sink.warmed)
+        close.assert_not_called()
+
+    def test_warmed_player_is_released_when_stopped_before_firing(self):
+        self.scheduler.start(self.settings(10))
+        self.assertTrue(self.sink.warmed)  # 10 秒內觸發，已預熱
+        self.scheduler.stop()
+        self.assertFalse(self.sink.warmed)
+        self.assertEqual(self.app.alarm_windows, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""在本機迴路上啟動多個 FleetAgent，測試控制端的推送、狀態查詢與錯誤處理"""
+
+import socket
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from power_scheduler import FleetAgent, FleetController
+
+
+class FakeExecutor:
+
+    def run(self, action, desktop_env="GNOME", custom_command=None):
+        return 0
+
+
+DAILY = {'task': "關機", 'mode': "每天", 'tz': "UTC", 'time': {'h': 22, 'm': 0, 's': 0}}
+
+
+class FleetTest(unittest.TestCase):
+    AGENTS = 20
+
+    def setUp(self):
+        self.agents = []
+        for _ in range(self.AGENTS):
+            agent = FleetAgent(("127.0.0.1", 0), "secret", executor=FakeExecutor())
+            agent.start()
+            self.agents.append(agent)
+        self.addCleanup(self.shutdown_agents)
+        self.hosts = [f"127.0.0.1:{agent.address[1]}" for agent in self.agents]
+
+    def shutdown_agents(self):
+        # shutdown() 要等 serve_forever 的輪詢間隔，並行關閉以縮短測試時間
+        with ThreadPoolExecutor(max_workers=self.AGENTS) as pool:
+            list(pool.map(FleetAgent.shutdown, self.agents))
+
+    def controller(self, hosts=None, token="secret"):
+        controller = FleetController(hosts or self.hosts, token, timeout=2)
+        self.addCleanup(controller.close)
+        return controller
+
+    def test_push_and_status(self):
+        controller = self.controller()
+        results = controller.push([DAILY])
+        self.assertTrue(all(results[host][0]['ok'] for host in self.hosts))
+        statuses = controller.status()
+        for host in self.hosts:
+            self.assertEqual(statuses[host][0]['jobs'], 1)
+            self.assertIsNotNone(statuses[host][0]['next_wakeup'])
+
+    def test_stagger_spreads_hosts_evenly(self):
+        self.controller().push([dict(DAILY, delay=5)], stagger=100)
+        delays = [agent.scheduler.jobs[0]['delay'] for agent in self.agents]
+        expected = [5 + 100 * i / self.AGENTS for i in range(self.AGENTS)]
+        self.assertEqual(delays, expected)
+
+        statuses = self.controller().status()
+        wakeups = [datetime.fromisoformat(statuses[host][0]['next_wakeup'])
+                   for host in self.hosts]
+        offsets = [(wakeup - wakeups[0]).total_seconds() for wakeup in wakeups]
+        self.assertEqual(offsets, [delay - 5 for delay in expected])
+
+    def test_wrong_token_is_rejected(self):
+        results = self.controller(token="wrong").push([DAILY])
+        for host in self.hosts:
+            self.assertFalse(results[host][0]['ok'])
+            self.assertEqual(results[host][0]['error'], "權杖錯誤")
+        self.assertTrue(all(agent.scheduler.jobs == [] for agent in self.agents))
+
+    def test_commands_need_allow_commands(self):
+        job = dict(DAILY, task="執行指令", custom_command="true")
+        results = self.controller().push([job])
+        self.assertFalse(any(results[host][0]['ok'] for host in self.hosts))
+
+        agent = FleetAgent(("127.0.0.1", 0), "secret", executor=FakeExecutor(),
+                           allow_commands=True)
+        agent.start()
+        self.addCleanup(agent.shutdown)
+        host = f"127.0.0.1:{agent.address[1]}"
+        self.assertTrue(self.controller([host]).push([job])[host][0]['ok'])
+
+    def test_unreachable_host(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            dead = f"127.0.0.1:{sock.getsockname()[1]}"
+        results = self.controller(self.hosts + [dead]).push([DAILY])
+        self.assertFalse(results[dead][0]['ok'])
+        self.assertTrue(all(results[host][0]['ok'] for host in self.hosts))
+
+    def test_invalid_job_list_is_rejected_before_sending(self):
+        controller = self.controller()
+        for jobs in ([5], {'task': "關機"}, [dict(DAILY, slack="x")]):
+            with self.subTest(jobs=jobs), self.assertRaises(ValueError):
+                controller.push(jobs)
+        self.assertEqual(controller.pool, {})
+
+    def test_malformed_request_keeps_connection(self):
+        agent = self.agents[0]
+        response = agent.handle_request(b'{"token": "secret", "cmd": "set_jobs", '
+                                        b'"jobs": [{"task": "\\u95dc\\u6a5f", "mode": "\\u6bcf\\u5929", '
+                                        b'"tz": 5, "time": {"h": 1, "m": 0, "s": 0}}]}')
+        self.assertFalse(response['ok'])
+        self.assertTrue(agent.handle_request(b'{"token": "secret", "cmd": "ping"}')['ok'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+"""HeadlessScheduler 的驗證、執行與喚醒後處理測試"""
+
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from power_scheduler import HeadlessScheduler
+
+
+class FakeExecutor:
+    """記錄被執行的任務；delay 模擬需要一段時間才完成的指令"""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def run(self, action, desktop_env="GNOME", custom_command=None):
+        time.sleep(self.delay)
+        with self.lock:
+            self.calls.append((action, custom_command))
+        return 0
+
+
+def countdown(seconds, **extra):
+    return dict({'task': "執行指令", 'mode': "倒數", 'custom_command': "true",
+                 'time': {'h': 0, 'm': 0, 's': seconds}}, **extra)
+
+
+class ValidationTest(unittest.TestCase):
+
+    def test_normalises_slack_and_delay(self):
+        scheduler = HeadlessScheduler([countdown(5, slack="1.5", delay=2)], FakeExecutor())
+        self.assertEqual(scheduler.jobs[0]['slack'], 1.5)
+        self.assertEqual(scheduler.jobs[0]['delay'], 2.0)
+
+    def test_rejects_bad_jobs(self):
+        for job in (countdown(5, tz=5), countdown(5, slack=-1), countdown(5, delay="x"),
+                    countdown(5, slack=float("inf")), dict(countdown(5), time=[1]),
+                    dict(countdown(5), task="鬧鐘"), 5):
+            with self.subTest(job=job), self.assertRaises(ValueError):
+                HeadlessScheduler([job], FakeExecutor())
+
+    def test_task_allowlist(self):
+        with self.assertRaises(ValueError):
+            HeadlessScheduler([countdown(5)], FakeExecutor(), tasks=["關機"])
+
+
+class RunTest(unittest.TestCase):
+
+    def test_one_shot_job_finishes_before_run_returns(self):
+        executor = FakeExecutor(delay=0.2)
+        scheduler = HeadlessScheduler([countdown(0), countdown(0, custom_command="echo")],
+                                      executor)
+        scheduler.run()
+        self.assertEqual(sorted(executor.calls), [("執行指令", "echo"), ("執行指令", "true")])
+        self.assertEqual(scheduler.timers.wakeups, 1)
+
+    def test_failing_job_does_not_stop_the_loop(self):
+        executor = FakeExecutor()
+        scheduler = HeadlessScheduler([countdown(0, custom_command="bad"), countdown(0)],
+                                      executor)
+        execute = scheduler._execute
+
+        def flaky(job):
+            if job['custom_command'] == "bad":
+                raise RuntimeError("boom")
+            execute(job)
+
+        scheduler._execute = flaky
+        scheduler.run()
+        self.assertEqual(executor.calls, [("執行指令", "true")])
+        self.assertEqual(scheduler.status()['failures'], 1)
+
+
+class ResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = HeadlessScheduler([
+            countdown(60),
+            {'task': "關機", 'mode': "每天", 'tz': "UTC", 'time': {'h': 22, 'm': 0, 's': 0}},
+            dict(countdown(60), slack=600),
+        ], FakeExecutor())
+        self.now = datetime.now(timezone.utc)
+        with self.scheduler.lock:
+            for index in range(3):
+                self.scheduler._schedule(index, self.now)
+
+    def set_deadline(self, index, deadline):
+        self.scheduler.deadlines[index] = deadline
+        self.scheduler.timers.add(index, deadline, self.scheduler.jobs[index]['slack'])
+
+    def test_stale_runs_are_dropped_and_recent_ones_kept(self):
+        self.set_deadline(0, self.now - timedelta(hours=10))
+        self.set_deadline(1, self.now - timedelta(hours=10))
+        self.set_deadline(2, self.now - timedelta(minutes=12))  # 在 5 分鐘 + 600 秒寬限內
+        self.scheduler._reconcile_after_resume(self.now)
+        timers = self.scheduler.timers.timers
+        self.assertNotIn(0, timers)  # 單次任務直接取消
+        self.assertGreater(timers[1][0], self.now)  # 每天的任務改排下一次
+        self.assertEqual(timers[2][0], self.now - timedelta(minutes=12))
+
+    def test_detects_resume_from_clock_gap(self):
+        self.set_deadline(0, self.now - timedelta(hours=10))
+        last_pass = (self.now - timedelta(hours=10), time.monotonic())
+        self.scheduler._detect_resume(self.now, last_pass)
+        self.assertNotIn(0, self.scheduler.timers.timers)
+
+    def test_no_resume_without_clock_gap(self):
+        self.set_deadline(0, self.now - timedelta(hours=10))
+        self.scheduler._detect_resume(self.now, (self.now, time.monotonic()))
+        self.assertIn(0, self.scheduler.timers.timers)
+
+
+if __name__ == "__main__":
+    unittest.main()
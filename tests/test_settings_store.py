@@ -0,0 +1,70 @@
+"""SettingsStore 讀取保存的排程時，忽略格式錯誤或不完整的檔案"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from power_scheduler import SettingsStore
+
+
+def daily(**extra):
+    return dict({'task': "關機", 'mode': "每天", 'desktop_env': "GNOME", 'remind': False,
+                 'tz': "UTC", 'time': {'h': 22, 'm': 0, 's': 0}}, **extra)
+
+
+class SettingsStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "last_job.json")
+        self.store = SettingsStore(self.path)
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(self.store.clear)
+
+    def write(self, content):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+
+    def test_round_trip(self):
+        self.store.save(daily())
+        self.assertEqual(self.store.load(), daily())
+
+    def test_missing_or_unreadable_file(self):
+        self.assertIsNone(self.store.load())
+        self.write("{not json")
+        self.assertIsNone(self.store.load())
+
+    def test_rejects_invalid_settings(self):
+        invalid = [
+            [daily()],
+            "just a string",
+            {k: v for k, v in daily().items() if k != 'task'},
+            {k: v for k, v in daily().items() if k != 'desktop_env'},
+            {k: v for k, v in daily().items() if k != 'remind'},
+            daily(remind="yes"),
+            daily(time=[22, 0, 0]),
+            daily(time={'h': 22, 'm': 0}),
+            daily(time={'h': "22", 'm': 0, 's': 0}),
+            daily(time={'h': 25, 'm': 0, 's': 0}),
+            daily(mode="每隔", time={'h': 0, 'm': 0, 's': 0}),
+            daily(mode="指定時間"),
+            daily(mode="未知"),
+            daily(tz=5),
+            daily(slack="10"),
+            daily(task="任務流程", graph="steps"),
+            daily(task="任務流程", graph=[{'id': "a", 'task': "關機", 'after': "a"}]),
+        ]
+        for settings in invalid:
+            with self.subTest(settings=settings):
+                self.write(settings)
+                self.assertIsNone(self.store.load())
+
+    def test_accepts_task_flow(self):
+        settings = daily(task="任務流程", graph=[{'id': "a", 'task': "關機"}], graph_workers=2)
+        self.write(settings)
+        self.assertEqual(self.store.load(), settings)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""TaskGraph 的並行、失敗傳遞、取消與關鍵路徑測試 (以假的 runner 執行)"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from power_scheduler import TaskGraph
+
+
+def step(step_id, after=(), **extra):
+    return dict({'id': step_id, 'task': "執行指令", 'after': list(after)}, **extra)
+
+
+class FakeRunner:
+    """記錄執行順序；durations 指定各步驟的耗時，failures 中的步驟回傳結束碼 1"""
+
+    def __init__(self, durations=None, failures=()):
+        self.durations = durations or {}
+        self.failures = set(failures)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, step):
+        with self.lock:
+            self.calls.append(step['id'])
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.durations.get(step['id'], 0))
+            return 1 if step['id'] in self.failures else 0
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+class ValidationTest(unittest.TestCase):
+
+    def assertInvalid(self, steps, **kwargs):
+        with self.assertRaises(ValueError):
+            TaskGraph(steps, **kwargs)
+
+    def test_rejects_bad_ids_and_dependencies(self):
+        self.assertInvalid([{'id': ["a"], 'task': "關機"}])
+        self.assertInvalid([{'id': "", 'task': "關機"}])
+        self.assertInvalid([{'id': "a"}])
+        self.assertInvalid([step("a"), step("a")])
+        self.assertInvalid([step("a"), {'id': "b", 'task': "關機", 'after': 5}])
+        self.assertInvalid([step("a"), {'id': "b", 'task': "關機", 'after': "a"}])
+        self.assertInvalid([step("a", ["missing"])])
+        self.assertInvalid([step("a", ["b"]), step("b", ["a"])])
+        self.assertInvalid([step("a", on_failure="retry")])
+        self.assertInvalid([step("a")], max_workers=0)
+        self.assertInvalid([step("a")], max_workers=True)
+
+    def test_from_file_rejects_other_json_types(self):
+        for content in ('"steps"', '5', '{"steps": {}}', '{"steps": [1]}'):
+            with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+                f.write(content)
+            self.addCleanup(os.remove, f.name)
+            with self.subTest(content=content), self.assertRaises(ValueError):
+                TaskGraph.from_file(f.name)
+
+    def test_from_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump({'max_workers': 2, 'steps': [step("a"), step("b", ["a"])]}, f)
+        self.addCleanup(os.remove, f.name)
+        graph = TaskGraph.from_file(f.name)
+        self.assertEqual(graph.max_workers, 2)
+        self.assertEqual(graph.order, ["a", "b"])
+
+
+class RunTest(unittest.TestCase):
+
+    def test_independent_steps_run_in_parallel(self):
+        graph = TaskGraph([step("a"), step("b"), step("c"), step("d", ["a", "b", "c"])])
+        runner = FakeRunner({"a": 0.1, "b": 0.1, "c": 0.1})
+        started = time.monotonic()
+        graph.run(runner)
+        self.assertLess(time.monotonic() - started, 0.25)
+        self.assertEqual(runner.max_active, 3)
+        self.assertEqual(runner.calls[-1], "d")
+        self.assertTrue(graph.succeeded)
+
+    def test_max_workers_limits_concurrency(self):
+        graph = TaskGraph([step(str(i)) for i in range(6)], max_workers=2)
+        runner = FakeRunner({str(i): 0.02 for i in range(6)})
+        graph.run(runner)
+        self.assertEqual(runner.max_active, 2)
+
+    def test_failure_stops_dependents(self):
+        graph = TaskGraph([step("a"), step("b", ["a"]), step("c", ["b"]), step("d")])
+        graph.run(FakeRunner(failures=["a"]))
+        statuses = {k: r['status'] for k, r in graph.results.items()}
+        self.assertEqual(statuses, {"a": "failed", "b": "skipped", "c": "skipped", "d": "ok"})
+        self.assertFalse(graph.succeeded)
+
+    def test_failure_with_continue_runs_dependents(self):
+        graph = TaskGraph([step("a", on_failure="continue"), step("b", ["a"])])
+        graph.run(FakeRunner(failures=["a"]))
+        self.assertEqual(graph.results["a"]['status'], "failed")
+        self.assertEqual(graph.results["b"]['status'], "ok")
+
+    def test_exception_counts_as_failure(self):
+        def runner(step):
+            raise OSError("boom")
+
+        graph = TaskGraph([step("a"), step("b", ["a"])])
+        graph.run(runner)
+        self.assertEqual(graph.results["a"], dict(graph.results["a"], status="failed", error="boom"))
+        self.assertEqual(graph.results["b"]['status'], "skipped")
+
+    def test_cancel_stops_new_steps(self):
+        graph = TaskGraph([step("a"), step("b", ["a"]), step("c", ["b"])], max_workers=1)
+
+        def runner(step):
+            graph.cancel()
+            return 0
+
+        graph.run(runner)
+        statuses = {k: r['status'] for k, r in graph.results.items()}
+        self.assertEqual(statuses, {"a": "ok", "b": "cancelled", "c": "cancelled"})
+        self.assertTrue(graph.cancelled)
+        self.assertIn("cancelled", graph.report())
+
+    def test_critical_path_follows_slowest_chain(self):
+        graph = TaskGraph([step("fast"), step("slow"), step("join", ["fast", "slow"]),
+                           step("off", ["join"])])
+        graph.run(FakeRunner({"fast": 0.01, "slow": 0.1}))
+        self.assertEqual(graph.critical_path(), ["slow", "join", "off"])
+        self.assertIn("關鍵路徑：slow → join → off", graph.report())
+
+    def test_critical_path_ignores_skipped_steps(self):
+        graph = TaskGraph([step("a"), step("b", ["a"]), step("c")])
+        graph.run(FakeRunner({"c": 0.05}, failures=["a"]))
+        self.assertEqual(graph.critical_path(), ["c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
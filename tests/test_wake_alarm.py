@@ -0,0 +1,117 @@
+"""WakeAlarm 以假的 sysfs 目錄測試，以及無介面排程在休眠前設定喚醒"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import power_scheduler
+from power_scheduler import HeadlessScheduler, WakeAlarm
+
+
+class FakeSysfsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.path.join(self.root, "wakealarm")
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("")
+        self.alarm = WakeAlarm(sysfs_root=self.root)
+        self.when = datetime(2030, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+    def tearDown(self):
+        os.remove(self.path)
+        os.rmdir(self.root)
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return f.read()
+
+    def test_program_writes_epoch(self):
+        self.assertTrue(self.alarm.program(self.when))
+        self.assertEqual(self.read(), str(int(self.when.timestamp())))
+
+    def test_clear_writes_zero(self):
+        self.alarm.program(self.when)
+        self.alarm.clear()
+        self.assertEqual(self.read(), "0")
+
+    def test_unsupported_rtc(self):
+        alarm = WakeAlarm(sysfs_root=os.path.join(self.root, "missing"))
+        self.assertFalse(alarm.is_supported())
+        self.assertFalse(alarm.program(self.when))
+        alarm.clear()  # 不支援時不做任何事
+
+    def test_permission_denied_falls_back_to_rtcwake(self):
+        result = mock.Mock(returncode=0)
+        with mock.patch.object(WakeAlarm, "_write", side_effect=PermissionError), \
+             mock.patch.object(power_scheduler.subprocess, "run", return_value=result) as run:
+            self.assertTrue(self.alarm.program(self.when))
+            self.alarm.clear()
+        device = os.path.basename(self.root)
+        epoch = str(int(self.when.timestamp()))
+        self.assertEqual(run.call_args_list[0].args[0],
+                         ["pkexec", "rtcwake", "-d", device, "-m", "no", "-t", epoch])
+        self.assertEqual(run.call_args_list[1].args[0],
+                         ["pkexec", "rtcwake", "-d", device, "-m", "disable"])
+
+    def test_permission_denied_without_rtcwake(self):
+        with mock.patch.object(WakeAlarm, "_write", side_effect=PermissionError), \
+             mock.patch.object(power_scheduler.subprocess, "run", side_effect=FileNotFoundError):
+            self.assertFalse(self.alarm.program(self.when))
+
+
+class RecordingAlarm:
+
+    def __init__(self):
+        self.programmed = []
+        self.cleared = 0
+
+    def program(self, when):
+        self.programmed.append(when)
+        return True
+
+    def clear(self):
+        self.cleared += 1
+
+
+class RecordingExecutor:
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, action, desktop_env="GNOME", custom_command=None):
+        self.calls.append(action)
+        return 0
+
+
+class HeadlessSuspendTest(unittest.TestCase):
+
+    def test_arms_earliest_other_deadline_before_suspend(self):
+        alarm = RecordingAlarm()
+        executor = RecordingExecutor()
+        scheduler = HeadlessScheduler([
+            {'task': "休眠", 'mode': "倒數", 'time': {'h': 0, 'm': 0, 's': 0}},
+            {'task': "重新開機", 'mode': "倒數", 'time': {'h': 2, 'm': 0, 's': 0}},
+            {'task': "關機", 'mode': "倒數", 'time': {'h': 1, 'm': 0, 's': 0}},
+        ], executor, wake_alarm=alarm)
+        thread = threading.Thread(target=scheduler.run)
+        thread.start()
+        for _ in range(100):
+            if executor.calls:
+                break
+            time.sleep(0.01)
+        scheduler.stop()
+        thread.join()
+
+        self.assertEqual(executor.calls, ["休眠"])
+        self.assertEqual(len(alarm.programmed), 1)
+        self.assertEqual(alarm.programmed[0], scheduler.timers.timers[2][0])
+        self.assertEqual(alarm.cleared, 1)  # 結束時清除
+
+
+if __name__ == "__main__":
+    unittest.main()
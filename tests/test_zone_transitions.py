@@ -0,0 +1,172 @@
+"""ZoneTransitions 夏令時間轉換的回歸測試 (重複與不存在的本地時間)"""
+
+import os
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from zoneinfo import ZoneInfo
+
+from power_scheduler import Scheduler, WakeAlarm, ZoneTransitions
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class ToUtcTest(unittest.TestCase):
+    # (時區, 重複的本地時間, 第一次出現的 UTC, 不存在的本地時間, 順延後的 UTC)
+    CASES = [
+        ("Europe/Berlin",
+         datetime(2026, 10, 25, 2, 30), utc(2026, 10, 25, 0, 30),
+         datetime(2026, 3, 29, 2, 30), utc(2026, 3, 29, 1, 30)),
+        ("America/New_York",
+         datetime(2026, 11, 1, 1, 30), utc(2026, 11, 1, 5, 30),
+         datetime(2026, 3, 8, 2, 30), utc(2026, 3, 8, 7, 30)),
+        # 豪勳爵島的夏令時間只差 30 分鐘
+        ("Australia/Lord_Howe",
+         datetime(2026, 4, 5, 1, 45), utc(2026, 4, 4, 14, 45),
+         datetime(2026, 10, 4, 2, 15), utc(2026, 10, 3, 15, 45)),
+    ]
+
+    def test_fold_uses_first_occurrence(self):
+        for name, fold, expected, _, _ in self.CASES:
+            with self.subTest(zone=name):
+                self.assertEqual(ZoneTransitions(name).to_utc(fold), expected)
+
+    def test_gap_shifts_forward(self):
+        for name, _, _, gap, expected in self.CASES:
+            with self.subTest(zone=name):
+                self.assertEqual(ZoneTransitions(name).to_utc(gap), expected)
+
+    def test_matches_zoneinfo_on_transition_days(self):
+        """逐 15 分鐘比對 zoneinfo (fold=0 的語意與本程式相同)"""
+        for name, fold, _, gap, _ in self.CASES:
+            table = ZoneTransitions(name)
+            zone = ZoneInfo(name)
+            for day in (fold, gap):
+                start = day.replace(hour=0, minute=0)
+                for step in range(96):
+                    local = start + timedelta(minutes=15 * step)
+                    with self.subTest(zone=name, local=local):
+                        expected = local.replace(tzinfo=zone).astimezone(timezone.utc)
+                        self.assertEqual(table.to_utc(local), expected)
+
+    def test_to_local_round_trip(self):
+        for name, fold, expected, _, _ in self.CASES:
+            with self.subTest(zone=name):
+                local = ZoneTransitions(name).to_local(expected)
+                self.assertEqual(local.replace(tzinfo=None), fold)
+                self.assertEqual(local, expected)
+
+
+class NextDailyTest(unittest.TestCase):
+
+    def assertSequence(self, name, hour, minute, after, expected):
+        table = ZoneTransitions(name)
+        for target in expected:
+            after = table.next_daily(hour, minute, 0, after)
+            self.assertEqual(after, target)
+
+    def test_berlin(self):
+        # 不存在的 02:30 順延為 03:30，隔天恢復 02:30
+        self.assertSequence("Europe/Berlin", 2, 30, utc(2026, 3, 28, 12), [
+            utc(2026, 3, 29, 1, 30), utc(2026, 3, 30, 0, 30)])
+        # 重複的 02:30 只執行第一次
+        self.assertSequence("Europe/Berlin", 2, 30, utc(2026, 10, 24, 12), [
+            utc(2026, 10, 25, 0, 30), utc(2026, 10, 26, 1, 30)])
+
+    def test_new_york(self):
+        self.assertSequence("America/New_York", 2, 30, utc(2026, 3, 7, 12), [
+            utc(2026, 3, 8, 7, 30), utc(2026, 3, 9, 6, 30)])
+        self.assertSequence("America/New_York", 1, 30, utc(2026, 10, 31, 12), [
+            utc(2026, 11, 1, 5, 30), utc(2026, 11, 2, 6, 30)])
+
+    def test_lord_howe(self):
+        self.assertSequence("Australia/Lord_Howe", 1, 45, utc(2026, 4, 4), [
+            utc(2026, 4, 4, 14, 45), utc(2026, 4, 5, 15, 15)])
+        self.assertSequence("Australia/Lord_Howe", 2, 15, utc(2026, 10, 3), [
+            utc(2026, 10, 3, 15, 45), utc(2026, 10, 4, 15, 15)])
+
+
+class TableTest(unittest.TestCase):
+
+    def test_extends_in_both_directions(self):
+        table = ZoneTransitions("Europe/Berlin")
+        zone = ZoneInfo("Europe/Berlin")
+        for year in (2026, 2040, 1990, 2026):
+            moment = utc(year, 7, 1)
+            expected = moment.astimezone(zone).utcoffset().total_seconds()
+            self.assertEqual(table.offset_at(int(moment.timestamp())), expected)
+
+    def test_concurrent_extension(self):
+        """其他執行緒擴充轉換表時，查詢結果必須一致"""
+        table = ZoneTransitions("America/New_York")
+        zone = ZoneInfo("America/New_York")
+        moments = [utc(year, month, 1) for year in range(1980, 2060, 3) for month in (1, 7)]
+        errors = []
+
+        def query(items):
+            for moment in items:
+                expected = moment.astimezone(zone).utcoffset().total_seconds()
+                if table.offset_at(int(moment.timestamp())) != expected:
+                    errors.append(moment)
+
+        threads = [threading.Thread(target=query, args=(moments[i::4],)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class LocalZoneNameTest(unittest.TestCase):
+
+    def test_tz_variable(self):
+        for value in ("Europe/Berlin", ":Europe/Berlin", "/usr/share/zoneinfo/Europe/Berlin"):
+            with self.subTest(TZ=value), mock.patch.dict(os.environ, {'TZ': value}):
+                self.assertEqual(ZoneTransitions.local_zone_name(), "Europe/Berlin")
+
+    def test_posix_rule_falls_back_to_system_zone(self):
+        with mock.patch.dict(os.environ, {'TZ': "UTC0"}), \
+             mock.patch("os.path.realpath", return_value="/usr/share/zoneinfo/Asia/Taipei"):
+            self.assertEqual(ZoneTransitions.local_zone_name(), "Asia/Taipei")
+
+    def test_nothing_usable_falls_back_to_utc(self):
+        with mock.patch.dict(os.environ, {'TZ': "EST5EDT,M3.2.0,M11.1.0"}), \
+             mock.patch("os.path.realpath", return_value="/etc/localtime"), \
+             mock.patch("builtins.open", side_effect=OSError):
+            self.assertEqual(ZoneTransitions.local_zone_name(), "UTC")
+
+
+class NextFireTimeTest(unittest.TestCase):
+
+    def scheduler(self, mode, **time_config):
+        scheduler = Scheduler(None, wake_alarm=WakeAlarm(sysfs_root="/nonexistent"))
+        scheduler.settings = {'mode': mode, 'tz': "Europe/Berlin", 'time': time_config}
+        return scheduler
+
+    def test_interval_uses_previous_until_it_passes(self):
+        scheduler = self.scheduler("每隔", h=0, m=10, s=0)
+        now = utc(2026, 3, 29, 0, 0)
+        self.assertEqual(scheduler.next_fire_time(now), now + timedelta(minutes=10))
+        previous = now + timedelta(minutes=3)
+        self.assertEqual(scheduler.next_fire_time(now, previous), previous)
+        self.assertEqual(scheduler.next_fire_time(previous, previous),
+                         previous + timedelta(minutes=10))
+
+    def test_one_shot_returns_previous_only_while_pending(self):
+        scheduler = self.scheduler("指定時間", year=2026, month=3, day=29, h=2, m=30, s=0)
+        target = utc(2026, 3, 29, 1, 30)
+        self.assertEqual(scheduler.next_fire_time(utc(2026, 3, 29), target), target)
+        self.assertIsNone(scheduler.next_fire_time(target, target))
+        self.assertIsNone(scheduler.next_fire_time(utc(2026, 3, 29)))
+
+    def test_daily_ignores_previous(self):
+        scheduler = self.scheduler("每天", h=2, m=30, s=0)
+        self.assertEqual(scheduler.next_fire_time(utc(2026, 3, 28, 12), utc(2030, 1, 1)),
+                         utc(2026, 3, 29, 1, 30))
+
+
+if __name__ == "__main__":
+    unittest.main()